@@ -0,0 +1,272 @@
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+AI_WORKERS = int(os.getenv("AI_WORKERS", "2"))
+# Separate workers for /analyze, so batch analysis never queues live games' moves
+ANALYZE_WORKERS = int(os.getenv("ANALYZE_WORKERS", "1"))
+# Solvers kept per search worker, most recently used board variants first.
+# Each holds a ~16 MB transposition table
+AI_SOLVER_CACHE = int(os.getenv("AI_SOLVER_CACHE", "2"))
+
+WIN_SCORE = 1000  # solved wins score above this, heuristics stay well below
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    """Fixed-size table indexed by key % size.
+
+    Replacement is depth-preferred: an entry from the current search is only
+    overwritten by a result searched at least as deep. Entries left over from
+    an earlier search are always fair game.
+    """
+
+    def __init__(self, size=1 << 20):
+        self.size = size
+        self.keys = [0] * size
+        self.entries = [None] * size
+        self.generation = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def get(self, key):
+        i = key % self.size
+        if self.keys[i] == key:
+            return self.entries[i]
+        return None
+
+    def put(self, key, depth, value, flag, move):
+        i = key % self.size
+        old = self.entries[i]
+        if old is not None and old[4] == self.generation and old[0] > depth and self.keys[i] != key:
+            return
+        self.keys[i] = key
+        self.entries[i] = (depth, value, flag, move, self.generation)
+
+
+class Solver:
+    """Negamax with alpha-beta, a transposition table and iterative deepening.
+
+    Works directly on the (position, mask) bitboards used by Connect4, where
+    position holds the stones of the player to move.
+    """
+
+    def __init__(self, cols=7, rows=6, k=4, tt_size=1 << 20):
+        self.cols = cols
+        self.rows = rows
+        self.k = k
+        self.height_bits = rows + 1
+        self.cells = cols * rows
+        self.bottom_mask = sum(1 << (c * self.height_bits) for c in range(cols))
+        self.board_mask = self.bottom_mask * ((1 << rows) - 1)
+        self.column_masks = [((1 << rows) - 1) << (c * self.height_bits) for c in range(cols)]
+        # Centre columns first: they take part in the most lines
+        self.order = sorted(range(cols), key=lambda c: abs(cols // 2 - c))
+        self.tt = TranspositionTable(tt_size)
+        self.nodes = 0
+        self.deadline = None
+
+    def winning_positions(self, position, mask):
+        """Empty cells that would complete k in a row for `position`."""
+        k = self.k
+        h = self.rows
+        h1 = self.height_bits
+        # vertical: the k - 1 cells below are ours
+        r = position << 1
+        for i in range(2, k):
+            r &= position << i
+        for s in (h1, h, h + 2):  # horizontal, both diagonals
+            # after[i] / before[i]: the i cells on either side of a cell are ours
+            # (-1 is all ones, so the 0-length runs are no-ops)
+            after, before = [-1], [-1]
+            for i in range(1, k):
+                after.append(after[-1] & (position >> i * s))
+                before.append(before[-1] & (position << i * s))
+            for a in range(k):
+                r |= after[a] & before[k - 1 - a]
+        return r & (self.board_mask ^ mask)
+
+    def possible(self, mask):
+        return (mask + self.bottom_mask) & self.board_mask
+
+    def evaluate(self, position, mask):
+        """Horizon score: our open threats minus the opponent's."""
+        mine = self.winning_positions(position, mask)
+        theirs = self.winning_positions(position ^ mask, mask)
+        return bin(mine).count("1") - bin(theirs).count("1")
+
+    def negamax(self, position, mask, moves, depth, alpha, beta):
+        self.nodes += 1
+        if self.nodes & 127 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        possible = self.possible(mask)
+        if possible & self.winning_positions(position, mask):
+            return WIN_SCORE + (self.cells + 1 - moves) // 2
+        if moves >= self.cells - 1:
+            # Our move fills the board without winning
+            return 0
+
+        opponent_win = self.winning_positions(position ^ mask, mask)
+        forced = possible & opponent_win
+        if forced:
+            if forced & (forced - 1):
+                # Two threats to block at once
+                return -(WIN_SCORE + (self.cells - moves) // 2)
+            possible = forced
+        possible &= ~(opponent_win >> 1)
+        if not possible:
+            return -(WIN_SCORE + (self.cells - moves) // 2)
+        if depth <= 0:
+            return self.evaluate(position, mask)
+
+        key = position + mask
+        alpha_orig = alpha
+        tt_move = None
+        entry = self.tt.get(key)
+        if entry is not None:
+            e_depth, e_value, e_flag, tt_move, _ = entry
+            if e_depth >= depth:
+                if e_flag == EXACT:
+                    return e_value
+                if e_flag == LOWER:
+                    alpha = max(alpha, e_value)
+                else:
+                    beta = min(beta, e_value)
+                if alpha >= beta:
+                    return e_value
+
+        best = -(WIN_SCORE * 2)
+        best_move = None
+        for col in self.ordered_moves(position, mask, possible, tt_move):
+            move = possible & self.column_masks[col]
+            value = -self.negamax(position ^ mask, mask | move, moves + 1, depth - 1, -beta, -alpha)
+            if value > best:
+                best = value
+                best_move = col
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.put(key, depth, best, flag, best_move)
+        return best
+
+    def ordered_moves(self, position, mask, possible, tt_move):
+        """TT move first, then moves creating the most threats, centre first on ties."""
+        scored = []
+        for i, col in enumerate(self.order):
+            move = possible & self.column_masks[col]
+            if not move:
+                continue
+            if col == tt_move:
+                scored.append((-100, i, col))
+                continue
+            threats = bin(self.winning_positions(position | move, mask | move)).count("1")
+            scored.append((-threats, i, col))
+        scored.sort()
+        return [col for _, _, col in scored]
+
+    def best_move(self, position, mask, moves, budget_ms=500, max_depth=None):
+        """Iteratively deepen until the budget runs out. Returns (col, score, depth)."""
+        self.deadline = time.perf_counter() + budget_ms / 1000.0
+        self.nodes = 0
+        self.tt.new_search()
+        if max_depth is None:
+            max_depth = self.cells - moves
+
+        legal = [c for c in self.order if self.possible(mask) & self.column_masks[c]]
+        if not legal:
+            return None, 0, 0
+        # Take an immediate win without searching
+        wins = self.possible(mask) & self.winning_positions(position, mask)
+        for col in legal:
+            if wins & self.column_masks[col]:
+                return col, WIN_SCORE + (self.cells + 1 - moves) // 2, 1
+
+        best_col, best_score, reached = legal[0], 0, 0
+        for depth in range(1, max_depth + 1):
+            try:
+                col, score = self.search_root(position, mask, moves, depth, legal)
+            except SearchTimeout:
+                break
+            best_col, best_score, reached = col, score, depth
+            if abs(score) >= WIN_SCORE:
+                break
+            # Put the last iteration's best move first for the next one
+            legal.remove(col)
+            legal.insert(0, col)
+        return best_col, best_score, reached
+
+    def search_root(self, position, mask, moves, depth, legal):
+        alpha, beta = -(WIN_SCORE * 2), WIN_SCORE * 2
+        best_col, best = legal[0], -(WIN_SCORE * 2)
+        possible = self.possible(mask)
+        for col in legal:
+            move = possible & self.column_masks[col]
+            value = -self.negamax(position ^ mask, mask | move, moves + 1, depth - 1, -beta, -alpha)
+            if value > best:
+                best, best_col = value, col
+            alpha = max(alpha, value)
+        return best_col, best
+
+
+# --- Search workers ---
+# Searches run in separate processes so neither the aiortc event loop nor
+# frame processing competes with the bot for the GIL. Live games and /analyze
+# get a pool each.
+POOL_WORKERS = {"game": AI_WORKERS, "analyze": ANALYZE_WORKERS}
+_executors = {}
+_solvers = OrderedDict()
+
+
+def _search(cols, rows, k, position, mask, moves, budget_ms):
+    # One solver per recently used board variant per worker, so its TT
+    # carries over between moves without every variant ever seen pinning one
+    variant = (cols, rows, k)
+    solver = _solvers.pop(variant, None)
+    if solver is None:
+        solver = Solver(cols, rows, k)
+    _solvers[variant] = solver
+    while len(_solvers) > max(1, AI_SOLVER_CACHE):
+        _solvers.popitem(last=False)
+    return solver.best_move(position, mask, moves, budget_ms)
+
+
+def submit_search(cols, rows, k, position, mask, moves, budget_ms, pool="game"):
+    """Schedule a search on a worker pool ("game" or "analyze") and return its future."""
+    executor = _executors.get(pool)
+    if executor is None:
+        executor = _executors[pool] = ProcessPoolExecutor(
+            max_workers=POOL_WORKERS[pool], mp_context=multiprocessing.get_context("spawn")
+        )
+    return executor.submit(_search, cols, rows, k, position, mask, moves, budget_ms)
+
+
+def warm_up():
+    """Spawn the search workers now rather than on the first AI move."""
+    futures = [submit_search(7, 6, 4, 0, 0, 0, 1) for _ in range(AI_WORKERS)]
+    for future in futures:
+        future.result()
+
+
+def shutdown():
+    while _executors:
+        _, executor = _executors.popitem()
+        # Waiting is bounded by the running searches' budgets; without it an
+        # idle search worker can miss its stop sentinel and outlive us
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -1,48 +1,353 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack, RTCConfiguration, RTCIceServer
 from aiortc.contrib.media import MediaBlackhole
+from aiortc.mediastreams import MediaStreamError
+from aiortc.sdp import candidate_from_sdp
 from contextlib import asynccontextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from av import VideoFrame
-from game import Game
-import cv2
+from canvas import I420
+from game import Connect4, Game, create_hands, warm_up
+from book import OpeningBook
+from handpool import HandTrackerPool, PoolExhausted
+from sessions import Session, SessionRegistry
+from recording import LandmarkRecorder
+from quality import QualityController
+from snapshots import SnapshotStore, new_token
+from workers import WorkerPool
+import metrics
+import ai
+import asyncio
+import math
+import numpy as np
 import time
+import uuid
 import os
 
+AI_BUDGET_MS = int(os.getenv("AI_BUDGET_MS", "500"))
+# Upper bound for search budgets clients ask for
+MAX_AI_BUDGET_MS = int(os.getenv("MAX_AI_BUDGET_MS", str(AI_BUDGET_MS * 10)))
+
+# Run MediaPipe every Nth frame and estimate the pinch in between
+INFER_EVERY = int(os.getenv("INFER_EVERY", "1"))
+LANDMARK_MODE = os.getenv("LANDMARK_MODE", "extrapolate")
+
+# MediaPipe input: downscale factor, and whether to crop around the last hand
+DETECT_SCALE = float(os.getenv("DETECT_SCALE", "1.0"))
+DETECT_ROI = os.getenv("DETECT_ROI", "0") == "1"
+
+# Step quality down (landmark drawing, detection scale, inference cadence,
+# frame dropping) when processing can't keep up with the incoming frame rate
+ADAPTIVE_QUALITY = os.getenv("ADAPTIVE_QUALITY", "1") == "1"
+
+# "thread": run process_frame in a worker thread and always process the newest
+# frame; "inline": process every frame on the event loop (old behaviour);
+# "process": like "thread", but each session is pinned to one of
+# FRAME_PROCESSES worker processes that run its Game
+PROCESSING_MODE = os.getenv("PROCESSING_MODE", "thread")
+FRAME_WORKERS = int(os.getenv("FRAME_WORKERS", str(os.cpu_count() or 1)))
+frame_executor = ThreadPoolExecutor(max_workers=FRAME_WORKERS, thread_name_prefix="frame")
+FRAME_PROCESSES = int(os.getenv("FRAME_PROCESSES", str(os.cpu_count() or 1)))
+
+# "bgr24": decode to BGR, draw, and let the encoder convert back to YUV;
+# "yuv420p": mirror and draw on the decoded planes and hand them straight to
+# the encoder, converting only MediaPipe's detection-sized input to RGB
+FRAME_FORMAT = os.getenv("FRAME_FORMAT", "bgr24")
+
+# Pre-warmed MediaPipe trackers shared by all sessions
+HAND_POOL_SIZE = int(os.getenv("HAND_POOL_SIZE", "4"))
+HAND_POOL_TIMEOUT = float(os.getenv("HAND_POOL_TIMEOUT", "5"))
+hand_pool = HandTrackerPool(create_hands, HAND_POOL_SIZE)
+
+# In "process" mode the trackers live in the worker processes instead
+worker_pool = WorkerPool(FRAME_PROCESSES, HAND_POOL_SIZE) if PROCESSING_MODE == "process" else None
+
+# When set, every session's per-frame landmarks are recorded here for replay
+RECORD_DIR = os.getenv("RECORD_DIR")
+
+def frame_pixels(vf):
+    """Writable (h, w, 3) view of a bgr24 VideoFrame's pixels (rows may be padded)."""
+    plane = vf.planes[0]
+    rows = np.frombuffer(plane, np.uint8).reshape(vf.height, plane.line_size)
+    return rows[:, :vf.width * 3].reshape(vf.height, vf.width, 3)
+
+# Largest board /offer accepts for Connect-K variants
+MAX_BOARD_SIZE = int(os.getenv("MAX_BOARD_SIZE", "20"))
+
+def game_kwargs(ai_player=None, ai_budget_ms=AI_BUDGET_MS, cols=7, rows=6, k=4):
+    return {
+        "ai_player": ai_player, "ai_budget_ms": ai_budget_ms,
+        "infer_every": INFER_EVERY, "landmark_mode": LANDMARK_MODE,
+        "detect_scale": DETECT_SCALE, "detect_roi": DETECT_ROI,
+        "cols": cols, "rows": rows, "k": k,
+    }
+
+def board_variant(params):
+    """(cols, rows, k) requested in /offer params, or None if out of range."""
+    try:
+        cols, rows, k = (int(params.get(name, default)) for name, default in (("cols", 7), ("rows", 6), ("k", 4)))
+    except (TypeError, ValueError):
+        return None
+    if not (4 <= cols <= MAX_BOARD_SIZE and 4 <= rows <= MAX_BOARD_SIZE and 3 <= k <= max(cols, rows)):
+        return None
+    return cols, rows, k
+
+def search_budget(value):
+    """A client's search budget in ms clamped to 1..MAX_AI_BUDGET_MS, or None if not an integer."""
+    try:
+        budget_ms = int(value)
+    except (TypeError, ValueError):
+        return None
+    return min(max(budget_ms, 1), MAX_AI_BUDGET_MS)
+
+# Opening book for /analyze (built with `python book.py generate`); positions
+# past its depth, or on other boards, fall back to a search of ANALYZE_BUDGET_MS
+OPENING_BOOK = os.getenv("OPENING_BOOK", os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.c4ob"))
+opening_book = OpeningBook(OPENING_BOOK) if os.path.exists(OPENING_BOOK) else None
+ANALYZE_BUDGET_MS = int(os.getenv("ANALYZE_BUDGET_MS", "100"))
+MAX_ANALYZE_POSITIONS = int(os.getenv("MAX_ANALYZE_POSITIONS", "256"))
+# Search time one /analyze request may take in total; per-position budgets
+# shrink to fit when many positions miss the book
+MAX_ANALYZE_MS = int(os.getenv("MAX_ANALYZE_MS", "2000"))
+
+def replay(moves, cols, rows, k):
+    """Connect4 after `moves` (a list of columns or a string of digits), or None if illegal."""
+    if isinstance(moves, str):
+        if not moves.isdigit() and moves:
+            return None
+        moves = [int(c) for c in moves]
+    if not isinstance(moves, list):
+        return None
+    board = Connect4(cols, rows, k)
+    for col in moves:
+        # bool is an int subclass; `true` is not column 1
+        if type(col) is not int or board.winner or not board.drop(col)[0]:
+            return None
+    return board
+
 class OpenCVCaptureTrack(VideoStreamTrack):
-    def __init__(self, track, res):
+    """Processed video track. `game` is a Game, or a workers.RemoteGame in "process" mode."""
+
+    def __init__(self, track, game):
         super().__init__()
-        self.game = Game(res)
+        self.game = game
         self.track = track
         self.running = True
         self.frame_id = 0
         self.start_time = time.time()
+        self.last_frame_time = time.monotonic()
 
-    async def recv(self):
-        frame = await self.track.recv()
-        img = frame.to_ndarray(format="bgr24")
+        # Control actions (reset, toggle) are queued and applied between frames
+        # so they never race a frame being processed on a worker thread
+        self.commands = deque()
+
+        # Latest-frame-wins slot filled by the reader task
+        self.latest = None
+        self.latest_ready = asyncio.Event()
+        self.reader = None
+        self.reader_error = None
+        self.dropped_frames = 0
+        self.pending = None
+        self.fps = 0.0
+        self.output_frames = [None, None]
+        self.output_index = 0
+        self.last_pts_time = None
+
+        # Called once the first processed frame is handed to the encoder
+        self.on_first_frame = None
+
+        self.quality = None
+        if ADAPTIVE_QUALITY:
+            self.quality = QualityController(base_scale=DETECT_SCALE, base_infer_every=INFER_EVERY)
+            self.quality.apply(self.game)
 
-        if(frame.width != 1280 or frame.height != 720):
-            img = cv2.resize(img, (1280, 720))
-            processed_frame = self.game.process_frame(img, key=None)
+    def reset_game(self):
+        self.commands.append(self.game.reset)
+
+    def toggle_hands(self):
+        self.commands.append(self.game.toggle_hands)
+
+    def process(self, frame):
+        """Full per-frame pipeline, safe to run off the event loop."""
+        while self.commands:
+            self.commands.popleft()()
+
+        start = t = time.perf_counter()
+        # yuv420p needs even dimensions, which every webcam delivers
+        planar = FRAME_FORMAT == "yuv420p" and frame.width % 2 == 0 and frame.height % 2 == 0
+        if planar:
+            if frame.format.name != "yuv420p":
+                frame = frame.reformat(format="yuv420p")
+            img = I420.from_frame(frame)
         else:
-            processed_frame = self.game.process_frame(img, key=None)
+            img = frame.to_ndarray(format="bgr24")
+        t = self.observe("decode", t)
+
+        # Processed at the client's native size; the game draws straight
+        # into the outgoing frame's pixels
+        new_frame = self.output_frame(frame.width, frame.height, "yuv420p" if planar else "bgr24")
+        out = I420.from_frame(new_frame) if planar else frame_pixels(new_frame)
+        # The game clock follows the client's capture timestamps
+        timestamp = None
+        if frame.pts is not None and frame.time_base is not None:
+            timestamp = float(frame.pts * frame.time_base)
+        self.game.process_frame(img, key=None, out=out, timestamp=timestamp)
+        for stage, seconds in self.game.stage_times.items():
+            metrics.stage_seconds.observe(seconds, stage)
+        t = time.perf_counter()
 
-        new_frame = VideoFrame.from_ndarray(processed_frame, format="bgr24")
+        # The encoder only takes yuv420p. Converting here rather than inside
+        # it costs the same and puts the conversion under the encode stage;
+        # yuv420p frames need none
+        if not planar:
+            new_frame = new_frame.reformat(format="yuv420p")
         new_frame.pts = frame.pts
         new_frame.time_base = frame.time_base
-        
+        t = self.observe("encode", t)
+        metrics.frame_seconds.observe(t - start)
+        metrics.frames_processed.inc()
+        if self.quality is not None and self.quality.update(t - start):
+            self.quality.apply(self.game)
+            print(f"Quality level -> {self.quality.level}: {self.quality.settings()}")
+
+        self.frame_id += 1
+        now = time.monotonic()
+        dt = now - self.last_frame_time
+        if dt > 0:
+            # Smoothed output frame rate
+            self.fps = 1 / dt if self.fps == 0 else 0.9 * self.fps + 0.1 / dt
+        self.last_frame_time = now
         return new_frame
 
+    def output_frame(self, w, h, format="bgr24"):
+        """Next of two reusable output frames.
+
+        The sender encodes a frame before asking for the next one, so
+        alternating between two is enough to never overwrite one in use.
+        """
+        self.output_index ^= 1
+        vf = self.output_frames[self.output_index]
+        if vf is None or vf.width != w or vf.height != h or vf.format.name != format:
+            vf = self.output_frames[self.output_index] = VideoFrame(w, h, format)
+        return vf
+
+    def observe(self, stage, start):
+        now = time.perf_counter()
+        metrics.stage_seconds.observe(now - start, stage)
+        return now
+
+    async def read_frames(self):
+        """Pull frames from the client as fast as they arrive, keeping only the newest."""
+        try:
+            while self.running:
+                frame = await self.track.recv()
+                self.note_incoming(frame)
+                if self.latest is not None:
+                    self.dropped_frames += 1
+                    metrics.frames_dropped.inc()
+                self.latest = frame
+                self.latest_ready.set()
+        except Exception as e:
+            self.reader_error = e
+            self.latest_ready.set()
+
+    async def next_frame(self):
+        if self.reader is None:
+            self.reader = asyncio.ensure_future(self.read_frames())
+        while self.latest is None:
+            if self.reader_error is not None:
+                raise MediaStreamError
+            self.latest_ready.clear()
+            await self.latest_ready.wait()
+        frame, self.latest = self.latest, None
+        return frame
+
+    def note_incoming(self, frame):
+        """Feed the client's frame interval, from frame timestamps, to the quality controller."""
+        if self.quality is None or frame.pts is None or frame.time_base is None:
+            return
+        pts_time = float(frame.pts * frame.time_base)
+        if self.last_pts_time is not None:
+            self.quality.observe_interval(pts_time - self.last_pts_time)
+        self.last_pts_time = pts_time
+
+    @property
+    def quality_level(self):
+        return self.quality.level if self.quality is not None else 0
+
+    def drop_every(self):
+        return self.quality.settings()["drop_every"] if self.quality is not None else 1
+
+    async def recv(self):
+        frame = await self.next_processed()
+        if self.on_first_frame is not None:
+            self.on_first_frame()
+            self.on_first_frame = None
+        return frame
+
+    async def next_processed(self):
+        if PROCESSING_MODE == "inline":
+            # Lowest quality rungs only process every Nth frame
+            for _ in range(self.drop_every() - 1):
+                self.note_incoming(await self.track.recv())
+                self.dropped_frames += 1
+                metrics.frames_dropped.inc()
+            frame = await self.track.recv()
+            self.note_incoming(frame)
+            return self.process(frame)
+
+        for _ in range(self.drop_every() - 1):
+            await self.next_frame()
+            self.dropped_frames += 1
+            metrics.frames_dropped.inc()
+        frame = await self.next_frame()
+        loop = asyncio.get_running_loop()
+        self.pending = loop.run_in_executor(frame_executor, self.process, frame)
+        return await self.pending
+
+    def stop(self):
+        super().stop()
+        self.running = False
+        if self.reader is not None:
+            self.reader.cancel()
+
+    async def snapshot(self):
+        """Stop the track and snapshot its game once any in-flight frame is done."""
+        self.stop()
+        if self.pending is not None and not self.pending.done():
+            await asyncio.wait([self.pending])
+        while self.commands:
+            self.commands.popleft()()
+        return await asyncio.to_thread(self.game.snapshot)
+
+    async def close(self):
+        """Stop the track and give its hand tracker back to the pool."""
+        self.stop()
+        if self.pending is not None and not self.pending.done():
+            # Let the in-flight frame finish before someone else gets the tracker
+            await asyncio.wait([self.pending])
+        if self.game.hands is not None:
+            hand_pool.release(self.game.hands)
+            self.game.hands = None
+        # A RemoteGame waits on its worker process to close
+        await asyncio.to_thread(self.game.close)
+
 # CRITICAL: Use your VM's EXTERNAL IP, not localhost or internal IP
 TURN_SERVER_IP = os.getenv("TURN_SERVER_IP", "EXTERNAL_IP")
 TURN_USERNAME = os.getenv("TURN_USERNAME", "username")
 TURN_PASSWORD = os.getenv("TURN_PASSWORD", "password")
 
+# STUN server for discovering the public IP; point it (and TURN_SERVER_IP)
+# at a local stand-in such as stunserver.py for testing
+STUN_SERVER = os.getenv("STUN_SERVER", "stun:stun.l.google.com:19302")
+
 # WebRTC configuration with ICE servers
 ICE_SERVERS = [
-    # Google's STUN servers (for discovering public IP)
-    RTCIceServer(urls="stun:stun.l.google.com:19302"),
+    # Google's STUN servers (for discovering public IP). aiortc only uses the first
+    RTCIceServer(urls=STUN_SERVER),
     RTCIceServer(urls="stun:stun1.l.google.com:19302"),
     
     # Your TURN server (for relaying when direct connection fails)
@@ -59,17 +364,101 @@ ICE_SERVERS = [
     # ),
 ]
 
+# Loopback testing (e.g. loadgen.py) needs no STUN/TURN: host candidates only
+if os.getenv("USE_ICE_SERVERS", "1") == "0":
+    ICE_SERVERS = []
+
 CONFIG = RTCConfiguration(ICE_SERVERS)
 
-pcs = set()
-active_tracks: set[OpenCVCaptureTrack] = set()
+# Sessions expire after SESSION_TTL seconds, or SESSION_IDLE_TIMEOUT seconds
+# without a processed frame or control call
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "60"))
+sessions = SessionRegistry(ttl=SESSION_TTL, idle_timeout=SESSION_IDLE_TIMEOUT)
+
+# Games of dropped sessions are kept this long, for this many sessions, so a
+# reconnecting client can resume with the token from its /offer answer
+SNAPSHOT_STORE_SIZE = int(os.getenv("SNAPSHOT_STORE_SIZE", "256"))
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", "600"))
+snapshots = SnapshotStore(SNAPSHOT_STORE_SIZE, SNAPSHOT_TTL)
+
+def session_samples(attr):
+    return [((s.id,), getattr(s.track, attr)) for s in sessions if s.track is not None]
+
+metrics.registry.register(metrics.CallbackGauge(
+    "connect4_session_fps", "Smoothed processed frames per second, per session.",
+    lambda: session_samples("fps"), ["session"]
+))
+metrics.registry.register(metrics.CallbackGauge(
+    "connect4_session_dropped_frames_total", "Stale frames dropped, per session.",
+    lambda: session_samples("dropped_frames"), ["session"], kind="counter"
+))
+metrics.registry.register(metrics.CallbackGauge(
+    "connect4_session_quality_level", "Adaptive quality level per session (0 = full quality).",
+    lambda: session_samples("quality_level"), ["session"]
+))
+metrics.registry.register(metrics.CallbackGauge(
+    "connect4_sessions_active", "Sessions currently registered.", lambda: [((), len(sessions))]
+))
+metrics.registry.register(metrics.CallbackGauge(
+    "connect4_sessions_evicted_total", "Sessions evicted for idling or exceeding their TTL.",
+    lambda: [((), sessions.evicted)], kind="counter"
+))
+if worker_pool is not None:
+    metrics.registry.register(metrics.CallbackGauge(
+        "connect4_worker_cpu_seconds_total", "CPU time used by the frame worker processes.",
+        lambda: [((), worker_pool.cpu_seconds())], kind="counter"
+    ))
+metrics.registry.register(metrics.CallbackGauge(
+    "connect4_snapshots", "Resume snapshot store state.",
+    lambda: [((k,), v) for k, v in snapshots.stats().items()], ["stat"]
+))
+metrics.registry.register(metrics.CallbackGauge(
+    "connect4_hand_pool", "Hand tracker pool state.",
+    lambda: [((k,), v) for k, v in (worker_pool or hand_pool).stats().items()], ["stat"]
+))
+
+# Warm-up runs in the background after startup, so the server accepts
+# connections (and answers health checks) right away; /ready reports 503 and
+# /offer waits until it's done
+warmup_task = None
+warmup_seconds = None
+
+async def warm_up_server():
+    global warmup_seconds
+    start = time.perf_counter()
+    if worker_pool is not None:
+        # Each worker warms its trackers and its own AI search pool
+        await asyncio.to_thread(worker_pool.start)
+    else:
+        await asyncio.to_thread(hand_pool.warm_up)
+        hands = await hand_pool.acquire_async()
+        try:
+            await asyncio.to_thread(warm_up, hands)
+        finally:
+            hand_pool.release(hands)
+        await asyncio.to_thread(ai.warm_up)
+    warmup_seconds = time.perf_counter() - start
+    print(f"Warm-up finished in {warmup_seconds:.1f}s")
+
+def is_ready():
+    return warmup_task is not None and warmup_task.done() and not warmup_task.cancelled() \
+        and warmup_task.exception() is None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global warmup_task
+    warmup_task = asyncio.create_task(warm_up_server())
+    evictor = asyncio.create_task(sessions.run_evictor())
     yield
-    for pc in pcs:
-        await pc.close()
-    pcs.clear()
+    warmup_task.cancel()
+    evictor.cancel()
+    await sessions.close_all()
+    hand_pool.close()
+    if worker_pool is not None:
+        worker_pool.close()
+    ai.shutdown()
+    frame_executor.shutdown(wait=False, cancel_futures=True)
 
 app = FastAPI(lifespan=lifespan)
 
@@ -92,9 +481,34 @@ async def offer_options():
 
 @app.post("/offer")
 async def offer(request: Request):
+    started = time.monotonic()
     params = await request.json()
+    if not is_ready():
+        await asyncio.shield(warmup_task)
     offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
     res = params.get("resolution")
+    # "ai" = single player against the built-in bot playing as player 2
+    ai_player = 2 if params.get("mode") == "ai" else None
+    ai_budget_ms = search_budget(params.get("ai_budget_ms", AI_BUDGET_MS))
+    if ai_budget_ms is None:
+        return JSONResponse({"error": "ai_budget_ms must be an integer"}, status_code=400)
+    # Connect-K variant: board size and line length (default 7x6, 4 in a row)
+    variant = board_variant(params)
+    if variant is None:
+        return JSONResponse({"error": f"cols and rows must be 4-{MAX_BOARD_SIZE}, k from 3 to the longer side"},
+                            status_code=400)
+    kwargs = game_kwargs(ai_player, ai_budget_ms, *variant)
+
+    # A token from an earlier answer picks the game back up where it was left
+    resume_token = params.get("resume_token")
+    if resume_token:
+        # The old connection may not have noticed it is gone yet
+        for old in sessions:
+            if old.resume_token == resume_token:
+                await sessions.remove(old.id)
+    resume_from = snapshots.take(resume_token) if resume_token else None
+    if resume_from is None:
+        resume_token = new_token()
     
     print("=" * 50)
     print("Received offer")
@@ -102,19 +516,47 @@ async def offer(request: Request):
     print(f"ICE Servers configured: {len(ICE_SERVERS)}")
     print("=" * 50)
 
+    # Picked up front so a process-mode recording can be named after it
+    session_id = uuid.uuid4().hex
+    record_path = None
+    try:
+        if worker_pool is not None:
+            # The session's Game is created on a worker up front; until a
+            # track takes it, the session holds it like a tracker
+            if RECORD_DIR:
+                record_path = os.path.join(RECORD_DIR, f"{session_id}.c4lm")
+            hands = await asyncio.to_thread(worker_pool.open, res, kwargs, record_path)
+            if resume_from is not None:
+                await asyncio.to_thread(hands.restore, resume_from)
+        else:
+            hands = await hand_pool.acquire_async(HAND_POOL_TIMEOUT)
+    except PoolExhausted:
+        if resume_from is not None:
+            snapshots.put(resume_token, resume_from)
+        return JSONResponse({"error": "server busy, try again shortly"}, status_code=503)
+
     pc = RTCPeerConnection(CONFIG)
-    pcs.add(pc)
+    session = sessions.add(Session(pc, hands, worker_pool or hand_pool, resume_token, snapshots, started,
+                                   session_id))
+    # Kept until a track takes the game, so a session that never gets that
+    # far puts it back for the next attempt. In process mode the worker's
+    # game already has it restored
+    session.resume_from = resume_from
 
     # Add detailed logging for ICE
     @pc.on("iceconnectionstatechange")
     async def on_ice_state_change():
         print(f"ICE Connection State: {pc.iceConnectionState}")
+        if pc.iceConnectionState == "completed":
+            session.mark("ice_connected")
         if pc.iceConnectionState == "failed":
             print("ICE CONNECTION FAILED - Check TURN server configuration!")
 
     @pc.on("connectionstatechange")
     async def on_connection_state_change():
         print(f"Connection State: {pc.connectionState}")
+        if pc.connectionState in ("failed", "closed"):
+            await sessions.remove(session.id)
 
     @pc.on("icegatheringstatechange")
     async def on_ice_gathering_state_change():
@@ -125,58 +567,203 @@ async def offer(request: Request):
     @pc.on("track")
     def on_track(track):
         print(f"Received track: {track.kind}")
-        if track.kind == "video":
-            local_video = OpenCVCaptureTrack(track, res)
-            active_tracks.add(local_video)
+        if track.kind == "video" and session.track is None:
+            if worker_pool is not None:
+                game = session.hands
+                session.resume_from = None
+            else:
+                game = Game(res, hands=session.hands, **kwargs)
+                # Recording first, so a restore is part of it
+                if RECORD_DIR:
+                    path = os.path.join(RECORD_DIR, f"{session.id}.c4lm")
+                    game.recorder = LandmarkRecorder(path)
+                if session.resume_from is not None:
+                    game.restore(session.resume_from)
+                    session.resume_from = None
+            local_video = OpenCVCaptureTrack(track, game)
+            local_video.on_first_frame = lambda: session.mark("first_frame")
+            session.attach_track(local_video)
             pc.addTrack(local_video)
         else:
             print(f"Received unsupported track: {track.kind}")
 
         @track.on("ended")
         async def on_ended():
-            local_video.running = False
             await recorder.stop()
-            await pc.close()
-            pcs.discard(pc)
+            await sessions.remove(session.id)
     
-    await pc.setRemoteDescription(offer)
-    answer = await pc.createAnswer()
-    await pc.setLocalDescription(answer)
+    try:
+        await pc.setRemoteDescription(offer)
+        answer = await pc.createAnswer()
+        await pc.setLocalDescription(answer)
+    except Exception as e:
+        # Don't leave the tracker checked out until the session idles out
+        print(f"Negotiation failed: {type(e).__name__}: {e}")
+        await sessions.remove(session.id)
+        return JSONResponse({"error": f"could not negotiate the offer: {e}"}, status_code=400)
 
     print(f"Answer created with {len(answer.sdp.splitlines())} SDP lines")
+    session.mark("answer")
 
-    return {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+    return {
+        "sdp": pc.localDescription.sdp,
+        "type": pc.localDescription.type,
+        "session_id": session.id,
+        "resume_token": resume_token,
+        "resumed": resume_from is not None
+    }
+
+def session_not_found():
+    return JSONResponse({"error": "unknown session_id"}, status_code=404)
 
 @app.post("/stop")
-async def stop():
-    for pc in pcs:
-        await pc.close()
-    pcs.clear()
+async def stop(request: Request):
+    params = await request.json()
+    # An explicit stop ends the game; nothing is kept for resuming
+    if await sessions.remove(params.get("session_id"), keep_state=False) is None:
+        return session_not_found()
     return {"status": "stopped"}
 
+@app.post("/candidate")
+async def candidate(request: Request):
+    """Trickle ICE: add one of the client's candidates after its offer.
+
+    Body: {"session_id", "candidate", "sdpMid", "sdpMLineIndex"} as in the
+    browser's RTCIceCandidate; an empty or missing candidate marks the end.
+    aiortc gathers the server's own candidates before answering, so those
+    always arrive in the answer SDP.
+    """
+    params = await request.json()
+    session = sessions.get(params.get("session_id"))
+    if session is None:
+        return session_not_found()
+    line = params.get("candidate")
+    if not line:
+        await session.pc.addIceCandidate(None)
+        return {"status": "end-of-candidates"}
+    try:
+        ice_candidate = candidate_from_sdp(line.split(":", 1)[1] if line.startswith("candidate:") else line)
+    except (IndexError, ValueError):
+        return JSONResponse({"error": "malformed candidate"}, status_code=400)
+    ice_candidate.sdpMid = params.get("sdpMid")
+    ice_candidate.sdpMLineIndex = params.get("sdpMLineIndex")
+    if ice_candidate.sdpMid is None and ice_candidate.sdpMLineIndex is None:
+        ice_candidate.sdpMLineIndex = 0
+    await session.pc.addIceCandidate(ice_candidate)
+    return {"status": "added"}
+
 @app.post("/reset")
 async def reset(request: Request):
     params = await request.json()
-    for track in active_tracks:
-        track.game.reset()
+    session = sessions.get(params.get("session_id"))
+    if session is None or session.track is None:
+        return session_not_found()
+    session.track.reset_game()
     return {"status": "reset"}
 
 @app.post("/toggle_tracking")
 async def toggle_tracking(request: Request):
     params = await request.json()
-    for track in active_tracks:
-        track.game.toggle_hands()
+    session = sessions.get(params.get("session_id"))
+    if session is None or session.track is None:
+        return session_not_found()
+    session.track.toggle_hands()
     return {"status": "toggled"}
 
+@app.post("/analyze")
+async def analyze(request: Request):
+    """Best move and score for a batch of positions, from the opening book where it has them"""
+    params = await request.json()
+    variant = board_variant(params)
+    if variant is None:
+        return JSONResponse({"error": f"cols and rows must be 4-{MAX_BOARD_SIZE}, k from 3 to the longer side"},
+                            status_code=400)
+    positions = params.get("positions")
+    if not isinstance(positions, list) or len(positions) > MAX_ANALYZE_POSITIONS:
+        return JSONResponse({"error": f"positions must be a list of at most {MAX_ANALYZE_POSITIONS} move sequences"},
+                            status_code=400)
+    budget_ms = search_budget(params.get("budget_ms", ANALYZE_BUDGET_MS))
+    if budget_ms is None:
+        return JSONResponse({"error": "budget_ms must be an integer"}, status_code=400)
+
+    results = [None] * len(positions)
+    boards = {}
+    for i, moves in enumerate(positions):
+        board = replay(moves, *variant)
+        if board is None:
+            results[i] = {"error": "illegal move sequence"}
+        elif board.winner or len(board.moves) == board.cols * board.rows:
+            # Game over: the player to move has lost, or it's a draw
+            cells = board.cols * board.rows
+            score = -(ai.WIN_SCORE + (cells + 2 - len(board.moves)) // 2) if board.winner else 0
+            results[i] = {"best_move": None, "score": score, "source": "final", "depth": 0}
+        else:
+            boards[i] = board
+
+    # All book lookups in one pass over the memory-mapped key table
+    if opening_book is not None and opening_book.covers(*variant):
+        in_book = [i for i, board in boards.items() if len(board.moves) <= opening_book.depth]
+        for i, hit in zip(in_book, opening_book.lookup_many([boards[i].key() for i in in_book])):
+            if hit is not None:
+                best_move, score, depth = hit
+                results[i] = {"best_move": best_move, "score": score, "source": "book", "depth": depth}
+                del boards[i]
+
+    # Whatever is left is searched on the analysis workers, within
+    # MAX_ANALYZE_MS for the whole request
+    if boards:
+        rounds = math.ceil(len(boards) / ai.ANALYZE_WORKERS)
+        budget_ms = max(1, min(budget_ms, MAX_ANALYZE_MS // rounds))
+    searched = await asyncio.gather(*(
+        asyncio.wrap_future(ai.submit_search(
+            board.cols, board.rows, board.k, board.pieces[board.current_player - 1], board.mask,
+            len(board.moves), budget_ms, pool="analyze"
+        ))
+        for board in boards.values()
+    ))
+    for i, (col, score, depth) in zip(boards, searched):
+        results[i] = {"best_move": col, "score": score, "source": "search", "depth": depth}
+
+    for result, moves in zip(results, positions):
+        result["moves"] = moves
+    return {"results": results}
+
+@app.get("/sessions")
+async def list_sessions():
+    """Active session count, how many have been evicted, and resume snapshots"""
+    return {"active": len(sessions), "evicted": sessions.evicted, **snapshots.stats()}
+
 @app.get("/")
 async def root():
     return {
         "status": "ok", 
         "message": "FastAPI backend is running!",
+        "ready": is_ready(),
         "turn_server": TURN_SERVER_IP,
         "ice_servers": len(ICE_SERVERS)
     }
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once trackers, the frame path and AI workers are warm, 503 before"""
+    if not is_ready():
+        error = None
+        if warmup_task is not None and warmup_task.done() and not warmup_task.cancelled():
+            error = repr(warmup_task.exception())
+        return JSONResponse({"status": "warming up" if error is None else "warm-up failed", "error": error},
+                            status_code=503)
+    return {"status": "ready", "warmup_seconds": warmup_seconds}
+
+@app.get("/pool")
+async def pool_stats():
+    """Hand tracker pool size, usage and checkout wait times"""
+    return (worker_pool or hand_pool).stats()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of frame timings, session and pool metrics"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/ice-config")
 async def ice_config():
     """Endpoint to verify ICE server configuration"""
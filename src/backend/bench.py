@@ -0,0 +1,210 @@
+"""Offline benchmark for Game.process_frame.
+
+Feeds synthetic frames or a recorded video through the frame pipeline at
+360p, 720p and/or 1080p, with no webcam or browser, and reports per-stage latency
+percentiles and throughput.
+
+--pipeline bgr24 or yuv420p runs the capture track's whole path instead, from
+a decoded yuv420p VideoFrame to one the encoder takes as is, including the
+colour conversions on either side (the "decode" and "encode" stages).
+
+    python bench.py                                  # synthetic, 720p and 1080p
+    python bench.py --video clip.mp4 --res 720 --frames 600
+    python bench.py --out results.json --compare baseline.json
+    python bench.py --pipeline yuv420p --compare bgr24.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+
+import cv2
+import numpy as np
+from av import VideoFrame
+
+from canvas import I420
+from game import Game
+
+RESOLUTIONS = {360: (640, 360), 720: (1280, 720), 1080: (1920, 1080)}
+
+
+def synthetic_frames(w, h, n):
+    """Textured frames with a bright blob moving across them."""
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 256, (h // 8, w // 8, 3), dtype=np.uint8)
+    base = cv2.resize(base, (w, h), interpolation=cv2.INTER_LINEAR)
+    frames = []
+    for i in range(min(n, 60)):
+        frame = base.copy()
+        x = int((i / 60) * w)
+        cv2.circle(frame, (x, h // 3), h // 10, (180, 200, 230), -1)
+        frames.append(frame)
+    return frames
+
+
+def video_frames(path, w, h, n):
+    """Decode up to n frames of a video up front so decoding is not measured."""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < n:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if frame.shape[1] != w or frame.shape[0] != h:
+            frame = cv2.resize(frame, (w, h))
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit(f"Could not read any frames from {path}")
+    return frames
+
+
+def summarize(samples):
+    ms = np.asarray(samples) * 1000
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "count": int(ms.size),
+    }
+
+
+def track_step(game, pipeline):
+    """Process one decoded yuv420p VideoFrame the way the capture track does,
+    ending with a frame the encoder needs no conversion for."""
+    out_vf = VideoFrame(game.screen_w, game.screen_h, pipeline)
+
+    def step(vf):
+        t = time.perf_counter()
+        img = I420.from_frame(vf) if pipeline == "yuv420p" else vf.to_ndarray(format="bgr24")
+        decode = time.perf_counter() - t
+        if pipeline == "yuv420p":
+            game.process_frame(img, key=None, out=I420.from_frame(out_vf))
+            encode = 0.0
+        else:
+            out = game.process_frame(img, key=None)
+            t = time.perf_counter()
+            VideoFrame.from_ndarray(out, format="bgr24").reformat(format="yuv420p")
+            encode = time.perf_counter() - t
+        game.stage_times["decode"] = decode
+        game.stage_times["encode"] = encode
+    return step
+
+
+def run(res, frames, n, warmup, game_kwargs, pipeline="game"):
+    game = Game(res, **game_kwargs)
+    if pipeline == "game":
+        step = lambda frame: game.process_frame(frame.copy(), key=None)
+    else:
+        frames = [VideoFrame.from_ndarray(f, format="bgr24").reformat(format="yuv420p") for f in frames]
+        game.set_layout(frames[0].width, frames[0].height)
+        step = track_step(game, pipeline)
+    for i in range(warmup):
+        step(frames[i % len(frames)])
+
+    stages = {}
+    totals = []
+    start = time.perf_counter()
+    for i in range(n):
+        frame = frames[i % len(frames)]
+        t = time.perf_counter()
+        step(frame)
+        totals.append(time.perf_counter() - t)
+        for stage, seconds in game.stage_times.items():
+            stages.setdefault(stage, []).append(seconds)
+    elapsed = time.perf_counter() - start
+    game.close()
+
+    return {
+        "frames": n,
+        "fps": n / elapsed,
+        "total": summarize(totals),
+        "stages": {stage: summarize(samples) for stage, samples in stages.items()},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    for res, r in results["runs"].items():
+        print(f"\n{res}p  {r['frames']} frames  {r['fps']:.1f} fps")
+        rows = [("total", r["total"])] + sorted(r["stages"].items(), key=lambda kv: -kv[1]["mean_ms"])
+        old = baseline["runs"].get(res) if baseline else None
+        print(f"  {'stage':<16}{'p50':>9}{'p95':>9}{'p99':>9}" + ("   p50 vs baseline" if old else ""))
+        for stage, s in rows:
+            line = f"  {stage:<16}{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}"
+            if old:
+                prev = old["total"] if stage == "total" else old["stages"].get(stage)
+                if prev and prev["p50_ms"] > 0:
+                    line += f"   {100 * (s['p50_ms'] / prev['p50_ms'] - 1):+6.1f}%"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Game.process_frame offline.")
+    parser.add_argument("--video", help="Video file to replay (default: synthetic frames)")
+    parser.add_argument("--res", type=int, nargs="+", choices=sorted(RESOLUTIONS), default=[720, 1080])
+    parser.add_argument("--frames", type=int, default=300, help="Frames to measure per resolution")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured frames before each run")
+    parser.add_argument("--infer-every", type=int, default=1)
+    parser.add_argument("--landmark-mode", default="extrapolate", choices=["extrapolate", "flow"])
+    parser.add_argument("--detect-scale", type=float, default=1.0)
+    parser.add_argument("--detect-roi", action="store_true")
+    parser.add_argument("--pipeline", default="game", choices=["game", "bgr24", "yuv420p"],
+                        help="game: process_frame on BGR arrays; bgr24/yuv420p: the track's path in that format")
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    game_kwargs = {
+        "infer_every": args.infer_every,
+        "landmark_mode": args.landmark_mode,
+        "detect_scale": args.detect_scale,
+        "detect_roi": args.detect_roi,
+    }
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+        },
+        "source": args.video or "synthetic",
+        "config": game_kwargs,
+        "pipeline": args.pipeline,
+        "runs": {},
+    }
+    for res in args.res:
+        w, h = RESOLUTIONS[res]
+        if args.video:
+            frames = video_frames(args.video, w, h, args.frames + args.warmup)
+        else:
+            frames = synthetic_frames(w, h, args.frames + args.warmup)
+        results["runs"][str(res)] = run(res, frames, args.frames, args.warmup, game_kwargs, args.pipeline)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Opening book: precomputed best moves and scores for early positions.
+
+A book file is a 24-byte header followed by four arrays: the sorted
+position keys (uint64), then each position's score (int16), best move (int8)
+and the depth its search completed (uint8). Files are opened with np.memmap, and a batch of lookups is one
+np.searchsorted over the key array, so only the pages a binary search
+touches are ever read.
+
+Positions and their mirror images share one entry, stored under the smaller
+of the two keys. Scores are from the point of view of the player to move.
+
+    python book.py generate --depth 5 --search-depth 6 --out opening_book.c4ob
+    python book.py lookup opening_book.c4ob 3 3 4
+"""
+import argparse
+import multiprocessing
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+import ai
+from game import Connect4
+
+MAGIC = b"C4OB"
+VERSION = 2
+HEADER = struct.Struct("<4sHBBBBxxIQ")  # magic, version, cols, rows, k, depth, count, max search depth
+HEADER_SIZE = 24
+
+
+def mirror_key(key, cols, height_bits):
+    """Key of the left-right mirrored position. Columns are independent bit blocks."""
+    col_mask = (1 << height_bits) - 1
+    mirrored = 0
+    for c in range(cols):
+        mirrored |= ((key >> (c * height_bits)) & col_mask) << ((cols - 1 - c) * height_bits)
+    return mirrored
+
+
+def canonical(key, cols, height_bits):
+    """(book key, whether the position is stored mirrored)."""
+    m = mirror_key(key, cols, height_bits)
+    return (m, True) if m < key else (key, False)
+
+
+def enumerate_positions(cols, rows, k, depth):
+    """One representative per canonical position reachable in at most `depth`
+    moves, skipping finished games. Returns [(move list, book key, mirrored)]."""
+    height_bits = rows + 1
+    seen = set()
+    frontier = [[]]
+    positions = []
+    for ply in range(depth + 1):
+        next_frontier = []
+        for moves in frontier:
+            board = Connect4(cols, rows, k)
+            for col in moves:
+                board.drop(col)
+            key, mirrored = canonical(board.key(), cols, height_bits)
+            if key in seen:
+                continue
+            seen.add(key)
+            positions.append((moves, key, mirrored))
+            if ply == depth:
+                continue
+            for col in board.valid_moves():
+                board.drop(col)
+                if not board.winner and len(board.moves) < cols * rows:
+                    next_frontier.append(moves + [col])
+                board.undo()
+        frontier = next_frontier
+    return positions
+
+
+# --- Generation workers ---
+_solver = None
+
+
+def _init_worker(cols, rows, k):
+    global _solver
+    _solver = ai.Solver(cols, rows, k)
+
+
+def _evaluate(args):
+    moves, search_depth = args
+    board = Connect4(_solver.cols, _solver.rows, _solver.k)
+    for col in moves:
+        board.drop(col)
+    # Fixed depth rather than a time budget, so book quality does not depend
+    # on the machine; positions that hit the time cap keep the depth they reached
+    return _solver.best_move(
+        board.pieces[board.current_player - 1], board.mask, len(board.moves),
+        budget_ms=60_000, max_depth=search_depth
+    )
+
+
+def generate(cols, rows, k, depth, search_depth, workers=None, progress=True):
+    """Search every book position on `workers` processes. Returns (keys, scores, moves, depths)."""
+    if cols * (rows + 1) > 64:
+        raise ValueError("opening books need board keys that fit in 64 bits")
+    positions = enumerate_positions(cols, rows, k, depth)
+    workers = workers or os.cpu_count() or 1
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    start = time.perf_counter()
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(cols, rows, k)) as pool:
+        jobs = ((moves, search_depth) for moves, _, _ in positions)
+        for i, result in enumerate(pool.imap(_evaluate, jobs, chunksize=16)):
+            results.append(result)
+            if progress and (i + 1) % 1000 == 0:
+                print(f"{i + 1}/{len(positions)} positions, {time.perf_counter() - start:.0f}s", file=sys.stderr)
+
+    keys = np.array([key for _, key, _ in positions], dtype=np.uint64)
+    scores = np.array([score for _, score, _ in results], dtype=np.int16)
+    best = np.array([
+        -1 if col is None else (cols - 1 - col if mirrored else col)
+        for (_, _, mirrored), (col, _, _) in zip(positions, results)
+    ], dtype=np.int8)
+    reached = np.array([d for _, _, d in results], dtype=np.uint8)
+    order = np.argsort(keys)
+    return keys[order], scores[order], best[order], reached[order]
+
+
+def write(path, cols, rows, k, depth, search_depth, keys, scores, moves, depths):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, cols, rows, k, depth, len(keys), search_depth))
+        keys.astype("<u8").tofile(f)
+        scores.astype("<i2").tofile(f)
+        moves.astype("i1").tofile(f)
+        depths.astype("u1").tofile(f)
+
+
+class OpeningBook:
+    """Read-only, memory-mapped opening book."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, version, cols, rows, k, depth, count, search_depth = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} opening book")
+        self.path = path
+        self.cols, self.rows, self.k = cols, rows, k
+        self.depth = depth
+        self.search_depth = search_depth
+        self.count = count
+        offset = HEADER_SIZE
+        self.keys = np.memmap(path, dtype="<u8", mode="r", offset=offset, shape=(count,))
+        offset += 8 * count
+        self.scores = np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(count,))
+        offset += 2 * count
+        self.moves = np.memmap(path, dtype="i1", mode="r", offset=offset, shape=(count,))
+        offset += count
+        self.depths = np.memmap(path, dtype="u1", mode="r", offset=offset, shape=(count,))
+
+    def covers(self, cols, rows, k):
+        return (cols, rows, k) == (self.cols, self.rows, self.k)
+
+    def lookup_many(self, keys):
+        """Look up a batch of Connect4.key() values in one searchsorted.
+
+        Returns a list of (best move, score, search depth) or None per key.
+        """
+        height_bits = self.rows + 1
+        canon = [canonical(key, self.cols, height_bits) for key in keys]
+        query = np.array([key for key, _ in canon], dtype=np.uint64)
+        idx = np.searchsorted(self.keys, query)
+        idx_clipped = np.minimum(idx, self.count - 1)
+        found = (idx < self.count) & (self.keys[idx_clipped] == query)
+        scores = self.scores[idx_clipped]
+        moves = self.moves[idx_clipped]
+        depths = self.depths[idx_clipped]
+
+        results = []
+        for (_, mirrored), hit, score, move, depth in zip(canon, found, scores, moves, depths):
+            if not hit:
+                results.append(None)
+                continue
+            move = int(move)
+            if move >= 0 and mirrored:
+                move = self.cols - 1 - move
+            results.append((None if move < 0 else move, int(score), int(depth)))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Opening book tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gen = sub.add_parser("generate", help="Search all early positions and write a book")
+    gen.add_argument("--cols", type=int, default=7)
+    gen.add_argument("--rows", type=int, default=6)
+    gen.add_argument("--k", type=int, default=4)
+    gen.add_argument("--depth", type=int, default=4, help="Book covers positions up to this many moves")
+    gen.add_argument("--search-depth", type=int, default=6, help="Search depth per position")
+    gen.add_argument("--workers", type=int, default=None, help="Processes to search with (default: all cores)")
+    gen.add_argument("--out", default="opening_book.c4ob")
+    look = sub.add_parser("lookup", help="Look up a position given as a move list")
+    look.add_argument("path")
+    look.add_argument("moves", type=int, nargs="*")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        start = time.perf_counter()
+        keys, scores, moves, depths = generate(args.cols, args.rows, args.k, args.depth, args.search_depth, args.workers)
+        write(args.out, args.cols, args.rows, args.k, args.depth, args.search_depth, keys, scores, moves, depths)
+        print(f"Wrote {len(keys)} positions to {args.out} in {time.perf_counter() - start:.1f}s")
+    else:
+        book = OpeningBook(args.path)
+        board = Connect4(book.cols, book.rows, book.k)
+        for col in args.moves:
+            board.drop(col)
+        print(book.lookup_many([board.key()])[0])
+
+
+if __name__ == "__main__":
+    main()
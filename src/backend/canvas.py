@@ -0,0 +1,205 @@
+"""Drawing surfaces for Game.process_frame.
+
+The game draws through a canvas, so the same code can draw on a bgr24 image
+or straight onto the planes of a yuv420p frame. The yuv420p path takes a
+session from decoder to encoder without a full-frame colour conversion: the
+frame is mirrored plane by plane, MediaPipe's RGB input is converted from
+the (cropped, downscaled) planes at detection size, and the overlay is drawn
+in YUV with colours converted once.
+"""
+import functools
+
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+class I420:
+    """A yuv420p image as plane arrays: y is (h, w), u and v are (h/2, w/2).
+
+    Width and height must be even.
+    """
+
+    __slots__ = ("y", "u", "v")
+
+    def __init__(self, y, u, v):
+        self.y = y
+        self.u = u
+        self.v = v
+
+    @property
+    def shape(self):
+        return self.y.shape
+
+    @property
+    def nbytes(self):
+        return self.y.size * 3 // 2
+
+    @property
+    def planes(self):
+        return self.y, self.u, self.v
+
+    @classmethod
+    def from_frame(cls, vf):
+        """Writable views of a yuv420p VideoFrame's planes (rows may be padded)."""
+        sizes = ((vf.height, vf.width), (vf.height // 2, vf.width // 2), (vf.height // 2, vf.width // 2))
+        views = []
+        for plane, (h, w) in zip(vf.planes, sizes):
+            rows = np.frombuffer(plane, np.uint8, count=h * plane.line_size).reshape(h, plane.line_size)
+            views.append(rows[:, :w])
+        return cls(*views)
+
+    @classmethod
+    def from_buffer(cls, buf, h, w):
+        """Views into a flat uint8 buffer laid out as Y, then U, then V."""
+        n, q = h * w, h * w // 4
+        return cls(
+            buf[:n].reshape(h, w),
+            buf[n:n + q].reshape(h // 2, w // 2),
+            buf[n + q:n + 2 * q].reshape(h // 2, w // 2),
+        )
+
+    def flip(self, out):
+        """Mirror left-right into `out` (which may be self)."""
+        for src, dst in zip(self.planes, out.planes):
+            cv2.flip(src, 1, dst=dst)
+        return out
+
+    def copy_to(self, out):
+        for src, dst in zip(self.planes, out.planes):
+            np.copyto(dst, src)
+        return out
+
+
+def to_i420(bgr):
+    """Convert a bgr24 image, padded to even size if needed, to I420."""
+    h, w = bgr.shape[:2]
+    if h % 2 or w % 2:
+        bgr = cv2.copyMakeBorder(bgr, 0, h % 2, 0, w % 2, cv2.BORDER_REPLICATE)
+        h, w = bgr.shape[:2]
+    return I420.from_buffer(cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420).reshape(-1), h, w)
+
+
+@functools.lru_cache(maxsize=64)
+def yuv_color(bgr):
+    """(Y, U, V) of a BGR colour, with OpenCV's own BT.601 coefficients."""
+    i420 = cv2.cvtColor(np.full((2, 2, 3), bgr, np.uint8), cv2.COLOR_BGR2YUV_I420)
+    return int(i420[0, 0]), int(i420[2, 0]), int(i420[2, 1])
+
+
+class BGRCanvas:
+    """Draws with OpenCV on a bgr24 image."""
+
+    def __init__(self, img):
+        self.img = img
+
+    @property
+    def shape(self):
+        return self.img.shape[:2]
+
+    def circle(self, center, radius, color, thickness=-1):
+        cv2.circle(self.img, center, radius, color, thickness)
+
+    def lines(self, segments, color, thickness):
+        cv2.polylines(self.img, segments, False, color, thickness)
+
+    def text(self, msg, org, scale, color, thickness):
+        cv2.putText(self.img, msg, org, FONT, scale, color, thickness)
+
+    def blend(self, x, y, overlay):
+        """50/50 blend of a bgr24 overlay at (x, y), in place."""
+        h, w = overlay.shape[:2]
+        roi = self.img[y:y + h, x:x + w]
+        cv2.addWeighted(roi, 0.5, overlay, 0.5, 0, dst=roi)
+
+    def gray(self, dst):
+        return cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY, dst=dst)
+
+    def detection_input(self, region, scale, buffers):
+        """RGB image of `region` scaled by `scale`, and the region it covers."""
+        x0, y0, x1, y1 = region
+        img = self.img[y0:y1, x0:x1]
+        if scale != 1.0:
+            size = (max(1, int((x1 - x0) * scale)), max(1, int((y1 - y0) * scale)))
+            small = buffers.get("detect", (size[1], size[0], 3))
+            img = cv2.resize(img, size, dst=small, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=buffers.get("rgb", img.shape)), region
+
+
+class I420Canvas:
+    """Draws on the planes of an I420 image.
+
+    Shapes go on the luma plane as given and on the chroma planes at half
+    position, size and thickness, so edges are as sharp as the encoder's
+    4:2:0 chroma would leave them anyway.
+    """
+
+    def __init__(self, img):
+        self.img = img
+
+    @property
+    def shape(self):
+        return self.img.shape
+
+    def circle(self, center, radius, color, thickness=-1):
+        y, u, v = yuv_color(color)
+        cv2.circle(self.img.y, center, radius, y, thickness)
+        half = (center[0] // 2, center[1] // 2)
+        r, t = max(1, radius // 2), thickness if thickness < 0 else max(1, thickness // 2)
+        cv2.circle(self.img.u, half, r, u, t)
+        cv2.circle(self.img.v, half, r, v, t)
+
+    def lines(self, segments, color, thickness):
+        y, u, v = yuv_color(color)
+        cv2.polylines(self.img.y, segments, False, y, thickness)
+        half = [s // 2 for s in segments]
+        t = max(1, thickness // 2)
+        cv2.polylines(self.img.u, half, False, u, t)
+        cv2.polylines(self.img.v, half, False, v, t)
+
+    def text(self, msg, org, scale, color, thickness):
+        y, u, v = yuv_color(color)
+        cv2.putText(self.img.y, msg, org, FONT, scale, y, thickness)
+        half = (org[0] // 2, org[1] // 2)
+        t = max(1, thickness // 2)
+        cv2.putText(self.img.u, msg, half, FONT, scale / 2, u, t)
+        cv2.putText(self.img.v, msg, half, FONT, scale / 2, v, t)
+
+    def blend(self, x, y, overlay):
+        """50/50 blend of an I420 overlay (see to_i420) at (x, y), in place."""
+        for plane, src, (px, py) in zip(self.img.planes, overlay.planes, ((x, y), (x // 2, y // 2), (x // 2, y // 2))):
+            roi = plane[py:py + src.shape[0], px:px + src.shape[1]]
+            cv2.addWeighted(roi, 0.5, src[:roi.shape[0], :roi.shape[1]], 0.5, 0, dst=roi)
+
+    def gray(self, dst):
+        # Luma is the grey image
+        np.copyto(dst, self.img.y)
+        return dst
+
+    def detection_input(self, region, scale, buffers):
+        """RGB image of `region` scaled by `scale`, and the region it covers.
+
+        The region is widened to even coordinates so it lines up with the
+        chroma planes. Only the detection-sized crop is colour converted.
+        """
+        x0, y0, x1, y1 = region
+        x0, y0 = x0 & ~1, y0 & ~1
+        x1, y1 = x1 + (x1 & 1), y1 + (y1 & 1)
+        w, h = x1 - x0, y1 - y0
+        if scale != 1.0:
+            w, h = max(2, int(w * scale) & ~1), max(2, int(h * scale) & ~1)
+        packed = buffers.get("detect_i420", (h * 3 // 2, w))
+        small = I420.from_buffer(packed.reshape(-1), h, w)
+        crops = (
+            self.img.y[y0:y1, x0:x1],
+            self.img.u[y0 // 2:y1 // 2, x0 // 2:x1 // 2],
+            self.img.v[y0 // 2:y1 // 2, x0 // 2:x1 // 2],
+        )
+        for src, dst in zip(crops, small.planes):
+            if src.shape == dst.shape:
+                np.copyto(dst, src)
+            else:
+                cv2.resize(src, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(packed, cv2.COLOR_YUV2RGB_I420, dst=buffers.get("rgb", (h, w, 3)))
+        return rgb, (x0, y0, x1, y1)
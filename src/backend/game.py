@@ -1,163 +1,655 @@
 import cv2
 import numpy as np
-import mediapipe as mp
 import time
+import struct
 from collections import deque
+import ai
+from canvas import BGRCanvas, I420, I420Canvas, to_i420
+from gesture import PinchGesture, landmark_array, tip_pixels, draw_hand
+
+# Snapshot headers: magic, version, then the fields below
+BOARD_SNAPSHOT = struct.Struct("<4sBBBBBBH")  # cols, rows, k, current player, winner, move count
+GAME_SNAPSHOT = struct.Struct("<4sB?d")  # show_hands, seconds since the last grab
+
+# Longest step the game clock takes between two frames (s), so a stalled
+# stream or a timestamp jump doesn't fast-forward the game
+MAX_FRAME_GAP = 0.5
 
 # --- Connect 4 Logic ---
 class Connect4:
-    def __init__(self, cols=7, rows=6):
+    """Bitboard Connect-K (Connect 4 by default) on any cols x rows board.
+
+    Each column takes rows + 1 bits (the extra bit is a sentinel that keeps
+    columns apart), bit 0 of a column is its bottom cell. One int per player
+    plus an occupancy mask is all the state, so moves, win checks and undo are
+    a handful of integer ops whatever the board size.
+    """
+
+    def __init__(self, cols=7, rows=6, k=4):
         self.cols = cols
         self.rows = rows
-        self.board = np.zeros((rows, cols), dtype=np.int8)
-        self.current_player = 1
-        self.winner = 0
+        self.k = k
+        self.height_bits = rows + 1
+        self.reset()
 
     def reset(self):
-        self.board.fill(0)
+        self.pieces = [0, 0]
+        self.mask = 0
+        self.moves = []
         self.current_player = 1
         self.winner = 0
 
+    def top_mask(self, col):
+        return 1 << (self.rows - 1 + col * self.height_bits)
+
+    def bottom_bit(self, col):
+        return 1 << (col * self.height_bits)
+
+    def column_mask(self, col):
+        return ((1 << self.rows) - 1) << (col * self.height_bits)
+
+    def can_play(self, col):
+        return 0 <= col < self.cols and not self.mask & self.top_mask(col)
+
     def valid_moves(self):
-        return [c for c in range(self.cols) if self.board[0, c] == 0]
+        return [c for c in range(self.cols) if not self.mask & self.top_mask(c)]
+
+    def cell(self, r, c):
+        """Player (0, 1 or 2) at row r (0 = top) and column c."""
+        bit = 1 << (c * self.height_bits + self.rows - 1 - r)
+        if self.pieces[0] & bit:
+            return 1
+        if self.pieces[1] & bit:
+            return 2
+        return 0
+
+    def bits_grid(self, bb):
+        """Bitboard as a (rows, cols) uint8 array of 0/1 (row 0 = top)."""
+        n = self.cols * self.height_bits
+        raw = np.frombuffer(bb.to_bytes((n + 7) // 8, "little"), dtype=np.uint8)
+        bits = np.unpackbits(raw, bitorder="little")[:n].reshape(self.cols, self.height_bits)
+        return bits[:, self.rows - 1::-1].T
+
+    @property
+    def board(self):
+        """Grid view of the position as a (rows, cols) int8 array (row 0 = top)."""
+        grid = self.bits_grid(self.pieces[0]).astype(np.int8)
+        grid += 2 * self.bits_grid(self.pieces[1]).astype(np.int8)
+        return grid
 
     def drop(self, col):
-        if self.board[0, col] != 0:
+        if not self.can_play(col):
             return False, None
-        for r in range(self.rows - 1, -1, -1):
-            if self.board[r, col] == 0:
-                self.board[r, col] = self.current_player
-                placed_row = r
-                break
-        self.check_win(placed_row, col)
-        self.current_player = 1 if self.current_player == 2 else 2
+        move = (self.mask + self.bottom_bit(col)) & self.column_mask(col)
+        placed_row = self.rows - move.bit_length() + col * self.height_bits
+        player = self.current_player
+        self.pieces[player - 1] |= move
+        self.mask |= move
+        self.moves.append(col)
+        if self.has_won(self.pieces[player - 1]):
+            self.winner = player
+        self.current_player = 1 if player == 2 else 2
         return True, placed_row
 
+    def undo(self):
+        """Take back the last move. Returns the column, or None if the board is empty."""
+        if not self.moves:
+            return None
+        col = self.moves.pop()
+        # Highest occupied cell in the column is the last stone played there
+        top = (self.mask & self.column_mask(col)).bit_length() - 1
+        move = 1 << top
+        self.current_player = 1 if self.current_player == 2 else 2
+        self.pieces[self.current_player - 1] &= ~move
+        self.mask &= ~move
+        self.winner = 0
+        return col
+
+    def has_won(self, bb):
+        """k in a row in any direction, via shift-and-AND over the whole board.
+
+        Run lengths double with each shift, so a direction costs about
+        log2(k) big-int ops rather than k.
+        """
+        k = self.k
+        for shift in (1, self.height_bits, self.height_bits - 1, self.height_bits + 1):
+            m, run = bb, 1
+            while run * 2 <= k:
+                m &= m >> (run * shift)
+                run *= 2
+            if run < k:
+                m &= m >> ((k - run) * shift)
+            if m:
+                return True
+        return False
+
     def check_win(self, r, c):
-        player = self.board[r, c]
+        player = self.cell(r, c)
         if player == 0:
             return False
-        dirs = [(1, 0), (0, 1), (1, 1), (1, -1)]
-        for dr, dc in dirs:
-            count = 1
-            # forward
-            rr, cc = r + dr, c + dc
-            while 0 <= rr < self.rows and 0 <= cc < self.cols and self.board[rr, cc] == player:
-                count += 1
-                rr += dr
-                cc += dc
-            # backward
-            rr, cc = r - dr, c - dc
-            while 0 <= rr < self.rows and 0 <= cc < self.cols and self.board[rr, cc] == player:
-                count += 1
-                rr -= dr
-                cc -= dc
-            if count >= 4:
-                self.winner = player
-                return True
+        if self.has_won(self.pieces[player - 1]):
+            self.winner = player
+            return True
         return False
-        
+
+    def key(self):
+        """Compact, hashable key that uniquely identifies the position."""
+        return self.pieces[self.current_player - 1] + self.mask
+
+    def snapshot(self):
+        """Position as bytes: a 12-byte header plus one byte per move played."""
+        header = BOARD_SNAPSHOT.pack(b"C4BD", 1, self.cols, self.rows, self.k,
+                                     self.current_player, self.winner, len(self.moves))
+        return header + bytes(self.moves)
+
+    @classmethod
+    def from_snapshot(cls, data):
+        """Rebuild a position by replaying the snapshot's moves."""
+        magic, version, cols, rows, k, current_player, winner, n = BOARD_SNAPSHOT.unpack_from(data)
+        if magic != b"C4BD" or version != 1:
+            raise ValueError("not a version 1 board snapshot")
+        moves = data[BOARD_SNAPSHOT.size:BOARD_SNAPSHOT.size + n]
+        board = cls(cols, rows, k)
+        for col in moves:
+            if not board.drop(col)[0]:
+                raise ValueError("board snapshot has an illegal move")
+        if len(moves) != n or (board.current_player, board.winner) != (current_player, winner):
+            raise ValueError("board snapshot is inconsistent")
+        return board
+
+class FrameBuffers:
+    """Per-session arena of reusable destination arrays.
+
+    Each stage asks for its buffer by name and gets a C-contiguous view of
+    the requested shape. Storage is only reallocated when a request needs
+    more bytes than that name has had so far.
+    """
+
+    def __init__(self):
+        self.storage = {}
+
+    def get(self, name, shape, dtype=np.uint8):
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        buf = self.storage.get(name)
+        if buf is None or buf.size < size:
+            buf = self.storage[name] = np.empty(size, dtype=np.uint8)
+        return buf[:size].view(dtype).reshape(shape)
+
+def create_hands():
+    """MediaPipe hand tracker configured for the game."""
+    # Imported here: mediapipe takes about a second to import, which server
+    # startup and the replay/benchmark tools shouldn't pay up front
+    import mediapipe as mp
+    return mp.solutions.hands.Hands(
+        min_detection_confidence=0.7,
+        min_tracking_confidence=0.5,
+        max_num_hands=1
+    )
+
+def warm_up(hands, res=720, frames=3):
+    """Push blank frames through the full Game.process_frame path, so MediaPipe's
+    first inferences and the per-frame buffers are set up before a player's first frame."""
+    w, h = (1920, 1080) if res == 1080 else (1280, 720)
+    game = Game(res, hands=hands)
+    frame = np.zeros((h, w, 3), dtype=np.uint8)
+    out = np.empty_like(frame)
+    for _ in range(frames):
+        game.process_frame(frame, key=None, out=out)
+    game.close()
+    hands.reset()
+
 class Game:
-    def __init__(self, res):
+    def __init__(self, res=720, ai_player=None, ai_budget_ms=500, infer_every=1, landmark_mode="extrapolate",
+                 detect_scale=1.0, detect_roi=False, roi_margin=0.5, hands=None, cols=7, rows=6, k=4):
         self.res = res
         self.show_hands = True
+        self.draw_landmarks = True  # quality knob, separate from the player's toggle
 
-        if(res == 1080):
-            self.screen_w, self.screen_h = 1920, 1080
-            self.board_w, self.board_h = 840, 720
-        else:
-            self.screen_w, self.screen_h = 1280, 720
-            self.board_w, self.board_h = 560, 480
-        
-        # --- Mediapipe Hand Setup ---
-        self.mp_hands = mp.solutions.hands
-        self.mp_drawing = mp.solutions.drawing_utils
+        self.connect4 = Connect4(cols, rows, k)
 
-        self.connect4 = Connect4()
+        # --- AI opponent (single-player mode) ---
+        self.ai_player = ai_player
+        self.ai_budget_ms = ai_budget_ms
+        self.ai_future = None
+        self.ai_key = None
 
-        self.grabbed_chip = None
-        self.pinch_history = deque(maxlen=5)
-        self.last_grab_time = 0
-        self.falling = []
+        # Pinch smoothing, held chip and falling chips
+        self.gesture = PinchGesture()
 
+        # Game clock (s) that gestures and animation run on. It advances by
+        # the frames' own timestamps when the caller has them (capture time,
+        # so processing jitter doesn't show), else by the monotonic clock
+        self.clock = 0.0
+        self.last_timestamp = None
+
+        # Initial layout from `res`; process_frame re-lays out for whatever
+        # size the frames actually are
+        if(res == 1080):
+            self.set_layout(1920, 1080)
+        else:
+            self.set_layout(1280, 720)
+
+        # A tracker can be lent by a HandTrackerPool; otherwise we own one
+        self.owns_hands = hands is None
+        self.hands = create_hands() if hands is None else hands
+        # A recording.LandmarkReplay has one full-frame record per frame, so
+        # it is run on every frame, uncropped
+        self.replaying = getattr(self.hands, "replays_frames", False)
+
+        # --- Inference cadence ---
+        # MediaPipe runs on every `infer_every`-th frame. In between, the thumb
+        # and index tips are estimated by "extrapolate" (constant velocity from
+        # the last two detections) or "flow" (Lucas-Kanade on the two tips).
+        self.infer_every = max(1, infer_every)
+        self.landmark_mode = landmark_mode
+        self.frame_index = 0
+        self.last_landmarks = None
+        self.tip_history = deque(maxlen=2)  # (frame_index, [[ix, iy], [tx, ty]])
+        self.tracked_tips = None
+        self.prev_gray = None
+
+        # --- Detection input ---
+        # MediaPipe sees the frame scaled by `detect_scale`, and with
+        # `detect_roi` only a crop around the last hand (grown by `roi_margin`
+        # of its size on each side). Losing the hand drops back to the full frame.
+        self.detect_scale = detect_scale
+        self.detect_roi = detect_roi
+        self.roi_margin = roi_margin
+        self.hand_box = None  # (x0, y0, x1, y1) of the last detected hand
+
+        # Optional recording.LandmarkRecorder capturing what the game saw each frame
+        self.recorder = None
+
+        # Reusable per-frame buffers, so the frame path does not allocate
+        self.buffers = FrameBuffers()
+
+        # Seconds spent in each stage of the last process_frame call
+        self.stage_times = {}
+
+
+    def set_layout(self, w, h):
+        """Derive board geometry, chip sizes and offsets from the frame size.
+
+        The board is two thirds of the frame height with square cells (560x480
+        at 720p, 840x720 at 1080p), narrowed if the frame is too thin for it.
+        """
+        cols, rows = self.connect4.cols, self.connect4.rows
+        self.screen_w, self.screen_h = w, h
+        cell = min((2 * h // 3) // rows, int(w * 0.9) // cols)
+        self.board_w, self.board_h = cell * cols, cell * rows
         self.board_x, self.board_y = int(self.screen_w / 2 - self.board_w / 2), int(self.screen_h / 2 - self.board_h / 3)
 
-        self.hands = self.mp_hands.Hands(
-            min_detection_confidence=0.7,
-            min_tracking_confidence=0.5,
-            max_num_hands=1
-        )
+        self.chip_radius = int(cell * 0.34)
+        self.drag_offset = self.board_h // 16  # keep a dragged chip clear of the board
+        self.fall_speed = self.board_h * 1.25  # falling chip speed, px/s
+        self.text_scale = h / 720
+        self.text_origin = (int(20 * self.text_scale), int(40 * self.text_scale))
+        self.pinch_dot = max(3, int(10 * self.text_scale))
 
+        # Everything in board coordinates is stale now. The overlay cache
+        # holds the rendered board and the (player 1, player 2) bitboards it shows
+        self.board_overlay = None
+        self.board_overlay_i420 = None
+        self.overlay_pieces = None
+        self.gesture.clear_chips()
 
     def render_board(self, board: Connect4, width, height):
         """Draw the board as an overlay image."""
         rows, cols = board.rows, board.cols
-        cell_w = width // cols
-        cell_h = height // rows
 
         img = np.zeros((height, width, 3), dtype=np.uint8)
         img[:] = (200, 30, 30)  # blue background
 
         for r in range(rows):
             for c in range(cols):
-                cx = int((c + 0.5) * cell_w)
-                cy = int((r + 0.5) * cell_h)
-                radius = int(min(cell_w, cell_h) * 0.38)
-                cv2.circle(img, (cx, cy), radius, (230, 230, 230), -1)
-                if board.board[r, c] == 1:
-                    cv2.circle(img, (cx, cy), radius - 4, (0, 0, 255), -1)
-                elif board.board[r, c] == 2:
-                    cv2.circle(img, (cx, cy), radius - 4, (0, 255, 255), -1)
+                self.paint_cell(img, r, c, board.cell(r, c), rows, cols)
         return img
 
+    def paint_cell(self, img, r, c, player, rows, cols):
+        """Draw one hole of the board overlay, with its chip if any."""
+        height, width = img.shape[:2]
+        cell_w = width // cols
+        cell_h = height // rows
+        cx = int((c + 0.5) * cell_w)
+        cy = int((r + 0.5) * cell_h)
+        radius = int(min(cell_w, cell_h) * 0.38)
+        inner = radius - min(4, max(1, radius // 7))  # thinner rim on small cells
+        cv2.circle(img, (cx, cy), radius, (230, 230, 230), -1)
+        if player == 1:
+            cv2.circle(img, (cx, cy), inner, (0, 0, 255), -1)
+        elif player == 2:
+            cv2.circle(img, (cx, cy), inner, (0, 255, 255), -1)
+
+    def get_board_overlay(self):
+        """Board overlay for the current position.
+
+        The overlay is only redrawn when the position changes, and then only
+        the cells whose bits differ from the cached one.
+        """
+        c4 = self.connect4
+        pieces = (c4.pieces[0], c4.pieces[1])
+        if self.board_overlay is None:
+            self.board_overlay = self.render_board(c4, self.board_w, self.board_h)
+        elif pieces != self.overlay_pieces:
+            changed = (pieces[0] ^ self.overlay_pieces[0]) | (pieces[1] ^ self.overlay_pieces[1])
+            while changed:
+                bit = changed & -changed
+                idx = bit.bit_length() - 1
+                c, h = divmod(idx, c4.height_bits)
+                r = c4.rows - 1 - h
+                self.paint_cell(self.board_overlay, r, c, c4.cell(r, c), c4.rows, c4.cols)
+                changed ^= bit
+            self.board_overlay_i420 = None
+        self.overlay_pieces = pieces
+        return self.board_overlay
+
+    def get_board_overlay_i420(self):
+        """The board overlay converted for yuv420p frames, redone only when it changes."""
+        overlay = self.get_board_overlay()
+        if self.board_overlay_i420 is None:
+            self.board_overlay_i420 = to_i420(overlay)
+        return self.board_overlay_i420
+
 
     def board_point_to_col(self, x, width, cols=7):
         """Convert an x-coordinate to board column."""
         cell_w = width / cols
         return max(0, min(cols - 1, int(x // cell_w)))
 
+    def estimate_tips(self, gray, w, h):
+        """Tip positions on a frame where MediaPipe was skipped, or None."""
+        if not self.tip_history:
+            return None
+        if (self.landmark_mode == "flow" and gray is not None
+                and self.prev_gray is not None and self.tracked_tips is not None):
+            pts = self.tracked_tips.astype(np.float32).reshape(-1, 1, 2)
+            new_pts, status, _ = cv2.calcOpticalFlowPyrLK(
+                self.prev_gray, gray, pts, None, winSize=(21, 21), maxLevel=2
+            )
+            if status is not None and status.all():
+                tips = new_pts.reshape(2, 2).astype(float)
+                np.clip(tips, 0, [w - 1, h - 1], out=tips)
+                return tips
+        last_index, last_tips = self.tip_history[-1]
+        if len(self.tip_history) < 2:
+            return last_tips
+        prev_index, prev_tips = self.tip_history[0]
+        velocity = (last_tips - prev_tips) / (last_index - prev_index)
+        tips = last_tips + velocity * (self.frame_index - last_index)
+        np.clip(tips, 0, [w - 1, h - 1], out=tips)
+        return tips
+
+    def detection_region(self, w, h):
+        """Pixel region (x0, y0, x1, y1) to run MediaPipe on."""
+        if not self.detect_roi or self.hand_box is None or self.replaying:
+            return 0, 0, w, h
+        x0, y0, x1, y1 = self.hand_box
+        mx = (x1 - x0) * self.roi_margin
+        my = (y1 - y0) * self.roi_margin
+        # Keep the crop big enough for the palm detector to re-find the hand
+        m = max(mx, my, 0.1 * min(w, h))
+        return (
+            max(0, int(x0 - m)), max(0, int(y0 - m)),
+            min(w, int(x1 + m)), min(h, int(y1 + m))
+        )
+
+    def run_hands(self, canvas):
+        """MediaPipe on the (cropped, downscaled) detection input.
+
+        Returns the hand's (21, 3) landmark array, normalised to the full
+        frame as if the whole frame had been processed, or None.
+        """
+        h, w = canvas.shape
+        t = time.perf_counter()
+        rgb, (x0, y0, x1, y1) = canvas.detection_input(self.detection_region(w, h), self.detect_scale, self.buffers)
+        t = self.lap("detect_input", t)
+        results = self.hands.process(rgb)
+        self.lap("inference", t)
+        if not results.multi_hand_landmarks:
+            self.hand_box = None
+            return None
+
+        # Fresh array each detection: tip_history and last_landmarks keep it
+        landmarks = landmark_array(results.multi_hand_landmarks[0])
+        xy = landmarks[:, :2]
+        if (x0, y0, x1, y1) != (0, 0, w, h):
+            xy *= [(x1 - x0) / w, (y1 - y0) / h]
+            xy += [x0 / w, y0 / h]
+        (bx0, by0), (bx1, by1) = xy.min(axis=0) * [w, h], xy.max(axis=0) * [w, h]
+        self.hand_box = (bx0, by0, bx1, by1)
+        return landmarks
+
+    def detect_hand(self, canvas):
+        """Landmark array (for drawing) and tip positions for this frame.
+
+        Runs MediaPipe on inference frames and estimates the tips on the
+        frames in between.
+        """
+        h, w = canvas.shape
+        gray = None
+        if self.infer_every > 1 and self.landmark_mode == "flow":
+            # Alternate two buffers so prev_gray survives this frame
+            gray = canvas.gray(self.buffers.get(f"gray{self.frame_index % 2}", (h, w)))
+
+        if self.frame_index % self.infer_every == 0 or self.replaying:
+            landmarks = self.run_hands(canvas)
+            self.last_landmarks = landmarks
+            if landmarks is None:
+                tips = None
+                self.tip_history.clear()
+            else:
+                tips = tip_pixels(landmarks, w, h)
+                self.tip_history.append((self.frame_index, tips))
+        else:
+            landmarks = self.last_landmarks
+            tips = self.estimate_tips(gray, w, h)
+
+        self.tracked_tips = tips
+        self.prev_gray = gray
+        self.frame_index += 1
+        if self.recorder is not None:
+            self.record_landmarks(landmarks, tips, w, h)
+        return landmarks, tips
+
+    def record_landmarks(self, landmarks, tips, w, h):
+        """Record this frame's landmarks, with the tips the game actually used."""
+        if tips is None:
+            self.recorder.record(self.clock, None, (w, h))
+            return
+        record = self.buffers.get("record", (21, 3), np.float32)
+        if landmarks is None:
+            record[:] = 0
+        else:
+            record[:] = landmarks
+        record[[8, 4], :2] = tips / [w, h]
+        self.recorder.record(self.clock, record, (w, h))
+
+    def lap(self, stage, start):
+        """Record the time since `start` under `stage` and return the current time."""
+        now = time.perf_counter()
+        self.stage_times[stage] = now - start
+        return now
+
     def reset(self):
         self.connect4.reset()
-        self.falling.clear()
-        self.grabbed_chip = None
-        self.pinch_history.clear()
-        self.last_grab_time = 0
+        self.hand_box = None
+        self.cancel_ai()
+        self.gesture.reset()
+        if self.recorder is not None:
+            self.recorder.record_reset(self.clock)
 
     def toggle_hands(self):
         self.show_hands = not self.show_hands
 
-    def process_frame(self, frame, key):
+    def snapshot(self):
+        """Game state worth keeping across a reconnect, as compact bytes.
+
+        The board (with move history) plus the player's settings and grab
+        cooldown. Held and falling chips are transient and not kept.
+        """
+        header = GAME_SNAPSHOT.pack(b"C4GS", 2, self.show_hands, self.clock - self.gesture.last_grab_time)
+        return header + self.connect4.snapshot()
+
+    def restore(self, data):
+        """Continue from a snapshot() taken of another Game."""
+        magic, version, show_hands, grab_age = GAME_SNAPSHOT.unpack_from(data)
+        if magic != b"C4GS" or version != 2:
+            raise ValueError("not a version 2 game snapshot")
+        self.connect4 = Connect4.from_snapshot(data[GAME_SNAPSHOT.size:])
+        self.cancel_ai()
+        self.gesture.reset()
+        # The cooldown carries over relative to this game's clock
+        self.gesture.last_grab_time = self.clock - grab_age
+        self.show_hands = show_hands
+        if self.recorder is not None:
+            self.recorder.record_restore(self.clock, data)
+        # The board size may differ from this game's
+        self.set_layout(self.screen_w, self.screen_h)
+
+    def close(self):
+        """Release the hand tracker if this game created it."""
+        self.cancel_ai()
+        if self.owns_hands and self.hands is not None:
+            self.hands.close()
+        self.hands = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def cancel_ai(self):
+        """Drop the bot's pending search. One still queued is taken off the
+        AI workers; one already running ends within its budget and is ignored."""
+        if self.ai_future is not None:
+            self.ai_future.cancel()
+        self.ai_future = None
+        self.ai_key = None
+
+    def ai_turn(self):
+        return self.ai_player is not None and self.connect4.current_player == self.ai_player
+
+    def update_ai(self):
+        """Start a search on the AI's turn and play its move once it is ready.
+
+        The search runs in an AI worker process; this only polls the future,
+        so a frame never waits on the bot.
+        """
+        c4 = self.connect4
+        if self.ai_future is None:
+            if self.gesture.falling or not c4.valid_moves():
+                return  # let the player's chip land first
+            self.ai_key = c4.key()
+            self.ai_future = ai.submit_search(
+                c4.cols, c4.rows, c4.k,
+                c4.pieces[c4.current_player - 1], c4.mask, len(c4.moves), self.ai_budget_ms
+            )
+            return
+        if not self.ai_future.done():
+            return
+        future, self.ai_future = self.ai_future, None
+        if future.cancelled() or future.exception() is not None or self.ai_key != c4.key():
+            return  # board was reset while thinking
+        col = future.result()[0]
+        if col is not None:
+            self.drop_chip(col, self.ai_player)
+
+    def drop_chip(self, col, player):
+        """Play `col` and start the chip falling into place."""
+        c4 = self.connect4
+        success, row = c4.drop(col)
+        if success:
+            self.gesture.drop(
+                player, (col + 0.5) * (self.board_w / c4.cols), (row + 0.5) * (self.board_h / c4.rows), self.clock
+            )
+        return success
+
+    def advance_clock(self, timestamp=None):
+        """Move the game clock to a frame's `timestamp` (s, any origin), or by
+        the monotonic clock without one. Returns the new game time."""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self.last_timestamp is not None:
+            self.clock += min(max(timestamp - self.last_timestamp, 0.0), MAX_FRAME_GAP)
+        self.last_timestamp = timestamp
+        return self.clock
+
+    def update_game(self, pinch_detected, pinch_pos, now):
+        """Advance grab/drag/release and the falling chips to game time `now`.
+
+        Returns the smoothed pinch position. Takes no image, so recorded
+        landmarks can drive it directly.
+        """
+        self.clock = now
+        if not self.connect4.winner:
+            gesture = self.gesture
+            pinch_pos = gesture.smooth(pinch_pos, now)
+
+            # ---- Grab/Drag/Release logic ----
+            if self.ai_turn():
+                self.update_ai()
+            else:
+                player = self.connect4.current_player
+                x = gesture.update(
+                    pinch_detected, pinch_pos, now, player,
+                    self.board_x, self.board_y, self.board_w, self.drag_offset
+                )
+                if x is not None:
+                    self.drop_chip(self.board_point_to_col(x, self.board_w, self.connect4.cols), player)
+
+            # Animate falling chips
+            gesture.step_falling(now, self.fall_speed)
+        return pinch_pos
+
+    def process_frame(self, frame, key, out=None, timestamp=None):
+        """Mirror `frame`, run hand tracking and the game, and draw the result.
+
+        `frame` is a bgr24 array or a canvas.I420 (yuv420p planes); `out`
+        must be the same kind. The result is written to `out` when given (it
+        may be `frame` itself), otherwise to a buffer owned by this Game that
+        is reused on the next call. Either way the returned image is the one
+        drawn into. `timestamp` is the frame's capture time in seconds, if known.
+        """
         # print("DEBUG: process_frame called")
+        planar = isinstance(frame, I420)
         h, w = frame.shape[:2]
-
-        frame = cv2.flip(frame, 1)
+        self.stage_times = {}
+        now = self.advance_clock(timestamp)
+        t = time.perf_counter()
+        if (w, h) != (self.screen_w, self.screen_h):
+            self.set_layout(w, h)
+            self.hand_box = None
+            self.tip_history.clear()
+
+        if planar:
+            if out is None:
+                out = I420.from_buffer(self.buffers.get("frame_i420", (h * w * 3 // 2,)), h, w)
+            frame = frame.flip(out)
+            canvas = I420Canvas(frame)
+        else:
+            if out is None:
+                out = self.buffers.get("frame", frame.shape)
+            frame = cv2.flip(frame, 1, dst=out)
+            canvas = BGRCanvas(frame)
+        t = self.lap("flip", t)
         # Crop or scale board overlay region
-        board_overlay = self.render_board(self.connect4, self.board_w, self.board_h)
+        board_overlay = self.get_board_overlay_i420() if planar else self.get_board_overlay()
+        t = self.lap("overlay_render", t)
 
         # Process hand
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.hands.process(rgb)
+        landmarks, tips = self.detect_hand(canvas)
+        t = self.lap("detect", t)
 
         pinch_detected = False
         pinch_pos = None
 
         # print("DEBUG: Hand landmarks processing")
-        if results.multi_hand_landmarks:
-            hand = results.multi_hand_landmarks[0]
-            if self.show_hands:
-                self.mp_drawing.draw_landmarks(frame, hand, self.mp_hands.HAND_CONNECTIONS)
-
-            # Get thumb tip (4) and index tip (8)
-            ix = int(round(hand.landmark[8].x * w))
-            iy = int(round(hand.landmark[8].y * h))
-            tx = int(round(hand.landmark[4].x * w))
-            ty = int(round(hand.landmark[4].y * h))
-
-            # clamp to image bounds
-            ix = max(0, min(w - 1, ix))
-            iy = max(0, min(h - 1, iy))
-            tx = max(0, min(w - 1, tx))
-            ty = max(0, min(h - 1, ty))
+        if tips is not None:
+            if landmarks is not None and self.show_hands and self.draw_landmarks:
+                draw_hand(canvas, landmarks)
+                t = self.lap("draw_landmarks", t)
+
+            # Index tip (8) and thumb tip (4)
+            (ix, iy), (tx, ty) = tips
             dist = np.hypot(ix - tx, iy - ty)
 
             # Pinch threshold
@@ -167,103 +659,44 @@ class Game:
                 pinch_pos = np.array([(ix + tx) / 2, (iy + ty) / 2])
 
         # print("DEBUG: Game logic processing")
-        if not self.connect4.winner:
-            # Smooth pinch position
-            if pinch_pos is not None:
-                self.pinch_history.append(pinch_pos)
-                pinch_pos = np.mean(self.pinch_history, axis=0)
-            else:
-                self.pinch_history.clear()
-
-            # ---- Grab/Drag/Release logic ----
-            now = time.time()
-            if self.grabbed_chip is None:
-                if pinch_detected and (now - self.last_grab_time) > 2.0:
-                    # Start new grab
-                    if pinch_pos is not None:
-                        px, py = pinch_pos
-                        if py < self.board_y:  # allow grabbing only near top
-                            self.grabbed_chip = {
-                                "player": self.connect4.current_player,
-                                "pos": np.array([px - self.board_x, py], dtype=float)
-                            }
-                            self.last_grab_time = now
-            else:
-                # Dragging
-                if pinch_detected and pinch_pos is not None:
-                    if self.res == 1080:
-                        offset = 40
-                    else:
-                        offset = 30
-                    px, py = pinch_pos
-                    self.grabbed_chip["pos"][0] = px - self.board_x
-                    self.grabbed_chip["pos"][1] = np.clip(py, 0, self.board_y - offset)
-
-                else:
-                    # Released
-                    if(self.grabbed_chip["pos"][0] > 0 and self.grabbed_chip["pos"][0] < self.board_w and self.grabbed_chip["pos"][1] < self.board_y):
-                        # print(board_x, board_x + board_w, grabbed_chip["pos"][0]) : for debugging
-                        col = self.board_point_to_col(self.grabbed_chip["pos"][0], self.board_w, self.connect4.cols)
-                        success, row = self.connect4.drop(col)
-                        if success:
-                            self.falling.append({
-                                "player": self.grabbed_chip["player"],
-                                "x": (col + 0.5) * (self.board_w / self.connect4.cols),
-                                "y": 0,
-                                "target_y": (row + 0.5) * (self.board_h / self.connect4.rows),
-                                "t": 0.0
-                            })
-                        self.grabbed_chip = None
-                        self.last_grab_time = now
-                    else:
-                        # Cancel grab if released outside board
-                        self.grabbed_chip = None
-                        self.last_grab_time = now
-
-            # Animate falling chips
-            for chip in self.falling:
-                chip["t"] += 0.08
-                chip["y"] = min(chip["target_y"], chip["y"] + 20)
-
-            self.falling = [ch for ch in self.falling if ch["y"] < ch["target_y"]]
+        pinch_pos = self.update_game(pinch_detected, pinch_pos, now)
+        t = self.lap("game", t)
 
         # Draw the board overlay on frame
         # Overlay the board at (board_x, board_y) with size (board_w, board_h)
-        roi = frame[self.board_y:self.board_y + self.board_h, self.board_x:self.board_x + self.board_w]
-        blended = cv2.addWeighted(roi, 0.5, board_overlay, 0.5, 0)
-        frame[self.board_y:self.board_y + self.board_h, self.board_x:self.board_x + self.board_w] = blended
-
+        # Blend straight into the frame's ROI view, no temporary image
+        canvas.blend(self.board_x, self.board_y, board_overlay)
+        t = self.lap("overlay_blend", t)
 
         # Info text
         if self.connect4.winner:
             msg = f"Player {self.connect4.winner} wins! Click \"Reset\" to reset."
         else:
-            msg = f"Player {self.connect4.current_player}'s turn"
-            # Draw grabbed or falling chips
-            cell_w = self.board_w / self.connect4.cols
-            cell_h = self.board_h / self.connect4.rows
-            if(self.res == 1080):
-                radius = int(min(cell_w, cell_h) * 0.34)
+            if self.ai_turn():
+                msg = "AI is thinking..."
             else:
-                radius = int(min(cell_w, cell_h) * 0.34)
+                msg = f"Player {self.connect4.current_player}'s turn"
+            # Draw grabbed or falling chips
+            radius = self.chip_radius
 
-            if self.grabbed_chip is not None:
-                cx = int(self.grabbed_chip["pos"][0] + self.board_x)
-                cy = int(self.grabbed_chip["pos"][1])
-                color = (0, 0, 255) if self.grabbed_chip["player"] == 1 else (0, 255, 255)
-                cv2.circle(frame, (cx, cy), radius, color, -1)
+            chip = self.gesture.grabbed
+            if chip is not None:
+                cx = int(chip.x + self.board_x)
+                cy = int(chip.y)
+                color = (0, 0, 255) if chip.player == 1 else (0, 255, 255)
+                canvas.circle((cx, cy), radius, color, -1)
 
-            for chip in self.falling:
-                cx = int(chip["x"] + self.board_x)
-                cy = int(chip["y"] + self.board_y)
-                color = (0, 0, 255) if chip["player"] == 1 else (0, 255, 255)
-                cv2.circle(frame, (cx, cy), radius, color, -1)
+            for chip in self.gesture.falling:
+                cx = int(chip.x + self.board_x)
+                cy = int(chip.y + self.board_y)
+                color = (0, 0, 255) if chip.player == 1 else (0, 255, 255)
+                canvas.circle((cx, cy), radius, color, -1)
 
             # Debug: show pinch
             if pinch_pos is not None and self.show_hands:
-                cv2.circle(frame, (int(pinch_pos[0]), int(pinch_pos[1])), 10, (0, 255, 255), -1)
+                canvas.circle((int(pinch_pos[0]), int(pinch_pos[1])), self.pinch_dot, (0, 255, 255), -1)
 
-        cv2.putText(frame, msg, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        
+        canvas.text(msg, self.text_origin, self.text_scale, (255, 255, 255), max(1, int(2 * self.text_scale)))
+        self.lap("draw", t)
         # print("DEBUG: process_frame completed")
         return frame
@@ -0,0 +1,189 @@
+"""Pinch gesture tracking.
+
+Landmarks are pulled out of MediaPipe's results into one (21, 3) NumPy array
+per frame, the pinch point is smoothed with a One Euro filter, and the
+grab/drag/release logic is a small state machine over `Chip` objects.
+"""
+import math
+
+import numpy as np
+
+NUM_LANDMARKS = 21
+INDEX_TIP = 8
+THUMB_TIP = 4
+
+# MediaPipe's 21-point hand topology (mp.solutions.hands.HAND_CONNECTIONS)
+HAND_CONNECTIONS = np.array([
+    (0, 1), (0, 5), (0, 17), (1, 2), (2, 3), (3, 4), (5, 6), (5, 9), (6, 7), (7, 8), (9, 10),
+    (9, 13), (10, 11), (11, 12), (13, 14), (13, 17), (14, 15), (15, 16), (17, 18), (18, 19), (19, 20),
+])
+
+# Grab cooldown after a grab or release (s)
+GRAB_COOLDOWN = 2.0
+
+
+def landmark_array(hand, out=None):
+    """MediaPipe hand landmarks as a (21, 3) float32 array of normalised x, y, z."""
+    if out is None:
+        out = np.empty((NUM_LANDMARKS, 3), dtype=np.float32)
+    for i, lm in enumerate(hand.landmark):
+        out[i] = lm.x, lm.y, lm.z
+    return out
+
+
+def tip_pixels(landmarks, w, h):
+    """Index and thumb tips in pixels, clamped to the frame: [[ix, iy], [tx, ty]]."""
+    tips = landmarks[[INDEX_TIP, THUMB_TIP], :2].astype(float) * [w, h]
+    np.round(tips, out=tips)
+    np.clip(tips, 0, [w - 1, h - 1], out=tips)
+    return tips
+
+
+def draw_hand(canvas, landmarks):
+    """Draw the hand like mediapipe's draw_landmarks with its default style."""
+    h, w = canvas.shape
+    xy = landmarks[:, :2]
+    visible = ((xy >= 0) & (xy <= 1)).all(axis=1)
+    px = np.minimum(np.floor(xy * [w, h]), [w - 1, h - 1]).astype(np.int32)
+
+    shown = visible[HAND_CONNECTIONS].all(axis=1)
+    lines = px[HAND_CONNECTIONS[shown]]
+    canvas.lines(list(lines), (224, 224, 224), 2)
+    for x, y in px[visible]:
+        canvas.circle((int(x), int(y)), 3, (224, 224, 224), 2)
+        canvas.circle((int(x), int(y)), 2, (0, 0, 255), 2)
+
+
+class OneEuroFilter:
+    """One Euro filter (Casiez et al.) for an n-dimensional point.
+
+    Heavy smoothing while the point is still, falling away as it speeds up,
+    so a resting pinch does not jitter and a fast drag barely lags.
+    `min_cutoff` (Hz) sets the smoothing at rest, `beta` how quickly speed
+    opens it up; `d_cutoff` (Hz) smooths the speed estimate itself.
+    """
+
+    __slots__ = ("min_cutoff", "beta", "d_cutoff", "x", "dx", "t")
+
+    def __init__(self, min_cutoff=1.0, beta=0.02, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.dx = None
+        self.t = None
+
+    @staticmethod
+    def alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, t):
+        x = np.asarray(x, dtype=float)
+        if self.x is None:
+            self.x = x.copy()
+            self.dx = np.zeros_like(x)
+            self.t = t
+            return self.x.copy()
+        dt = t - self.t
+        if dt <= 0:
+            dt = 1 / 30
+        self.t = t
+
+        a_d = self.alpha(self.d_cutoff, dt)
+        self.dx += a_d * ((x - self.x) / dt - self.dx)
+        cutoff = self.min_cutoff + self.beta * float(np.hypot(*self.dx))
+        self.x += self.alpha(cutoff, dt) * (x - self.x)
+        return self.x.copy()
+
+
+class Chip:
+    """A chip in hand or falling. x is relative to the board's left edge;
+    y is absolute while held and relative to the board's top while falling.
+    `t` is when a falling chip was dropped, on the game clock."""
+
+    __slots__ = ("player", "x", "y", "target_y", "t")
+
+    def __init__(self, player, x, y, target_y=0.0):
+        self.player = player
+        self.x = x
+        self.y = y
+        self.target_y = target_y
+        self.t = 0.0
+
+
+class PinchGesture:
+    """Grab/drag/release state machine for the pinch.
+
+    IDLE: a pinch above the board, outside the cooldown, grabs a chip.
+    DRAGGING: the chip follows the (smoothed) pinch. Letting go over the board
+    asks for a drop in that column; anywhere else cancels the grab.
+    """
+
+    IDLE = 0
+    DRAGGING = 1
+
+    __slots__ = ("state", "grabbed", "falling", "last_grab_time", "filter")
+
+    def __init__(self):
+        self.filter = OneEuroFilter()
+        self.falling = []
+        self.reset()
+
+    def reset(self):
+        self.clear_chips()
+        self.last_grab_time = float("-inf")
+        self.filter.reset()
+
+    def clear_chips(self):
+        """Drop the held chip and the falling ones, e.g. when the board moves."""
+        self.state = PinchGesture.IDLE
+        self.grabbed = None
+        self.falling.clear()
+
+    def smooth(self, pinch_pos, now):
+        if pinch_pos is None:
+            self.filter.reset()
+            return None
+        return self.filter(pinch_pos, now)
+
+    def update(self, pinching, pinch_pos, now, player, board_x, board_y, board_w, drag_offset):
+        """Advance one frame. Returns the released chip's x (board-relative)
+        when it was let go over the board, else None."""
+        if self.state == PinchGesture.IDLE:
+            if (pinching and pinch_pos is not None and now - self.last_grab_time > GRAB_COOLDOWN
+                    and pinch_pos[1] < board_y):  # allow grabbing only near top
+                self.grabbed = Chip(player, pinch_pos[0] - board_x, pinch_pos[1])
+                self.state = PinchGesture.DRAGGING
+                self.last_grab_time = now
+            return None
+
+        chip = self.grabbed
+        if pinching and pinch_pos is not None:
+            chip.x = pinch_pos[0] - board_x
+            chip.y = min(max(pinch_pos[1], 0), board_y - drag_offset)
+            return None
+
+        # Released
+        self.grabbed = None
+        self.state = PinchGesture.IDLE
+        self.last_grab_time = now
+        if 0 < chip.x < board_w and chip.y < board_y:
+            return chip.x
+        return None  # cancelled: released outside the board
+
+    def drop(self, player, x, target_y, now):
+        chip = Chip(player, x, 0.0, target_y)
+        chip.t = now
+        self.falling.append(chip)
+
+    def step_falling(self, now, fall_speed):
+        """Place falling chips where they are at time `now` and forget those
+        that landed. Positions come from the time since the drop, not a step
+        per frame, so skipped or dropped frames don't slow the fall."""
+        for chip in self.falling:
+            chip.y = min(chip.target_y, max(0.0, now - chip.t) * fall_speed)
+        self.falling[:] = [chip for chip in self.falling if chip.y < chip.target_y]
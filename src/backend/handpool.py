@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class HandTrackerPool:
+    """Bounded pool of pre-initialised MediaPipe Hands instances.
+
+    Sessions check a tracker out for their lifetime and hand it back when they
+    end, so model load and graph setup happen once at startup instead of on
+    every /offer, and memory is capped at `size` trackers.
+    """
+
+    def __init__(self, factory, size=4):
+        self.factory = factory
+        self.size = size
+        self.idle = deque()
+        self.created = 0
+        self.cond = threading.Condition()
+
+        # Metrics
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def warm_up(self):
+        """Create every tracker and push a dummy frame through it."""
+        dummy = np.zeros((360, 640, 3), dtype=np.uint8)
+        with self.cond:
+            missing = self.size - self.created
+            self.created = self.size
+        for _ in range(missing):
+            hands = self.factory()
+            hands.process(dummy)
+            hands.reset()
+            with self.cond:
+                self.idle.append(hands)
+                self.cond.notify()
+
+    def acquire(self, timeout=None):
+        """Check out a tracker, waiting up to `timeout` seconds for one to free up."""
+        start = time.perf_counter()
+        with self.cond:
+            while not self.idle:
+                if self.created < self.size:
+                    # Lazily fill the pool if warm_up has not run
+                    self.created += 1
+                    break
+                remaining = None if timeout is None else timeout - (time.perf_counter() - start)
+                if remaining is not None and remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolExhausted(f"all {self.size} hand trackers are in use")
+                self.cond.wait(remaining)
+            hands = self.idle.pop() if self.idle else None
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        if hands is None:
+            hands = self.factory()
+        return hands
+
+    async def acquire_async(self, timeout=None):
+        return await asyncio.to_thread(self.acquire, timeout)
+
+    def release(self, hands):
+        """Return a tracker. Its tracking state is cleared for the next session."""
+        hands.reset()
+        with self.cond:
+            self.idle.append(hands)
+            self.cond.notify()
+
+    def close(self):
+        with self.cond:
+            while self.idle:
+                self.idle.pop().close()
+                self.created -= 1
+
+    def stats(self):
+        with self.cond:
+            return {
+                "size": self.size,
+                "created": self.created,
+                "idle": len(self.idle),
+                "in_use": self.created - len(self.idle),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": 1000 * self.wait_total / self.checkouts if self.checkouts else 0.0,
+                "wait_max_ms": 1000 * self.wait_max,
+            }
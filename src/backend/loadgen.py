@@ -0,0 +1,345 @@
+"""Headless load generator for finding how many concurrent players a backend
+instance can serve.
+
+Starts N aiortc clients on this machine, each streaming synthetic or recorded
+video to /offer over loopback, and reports per-client received fps,
+end-to-end frame latency and the server CPU used per session. Each outgoing
+frame carries its sequence number as a strip of black and white cells in the
+bottom corner, which the client reads back from the processed frame to match
+it with its send time.
+
+Each client also reports how long its session took to start, from sending
+/offer to the first processed frame coming back.
+
+No real STUN/TURN is involved: clients only gather host candidates, and the
+server must run with USE_ICE_SERVERS=0 (--serve starts one that way), or
+with --standin both sides use the local stand-in from stunserver.py.
+--trickle sends the offer without candidates and posts them to /candidate.
+
+    python loadgen.py --serve --clients 4 --duration 30
+    python loadgen.py --serve --standin --trickle --clients 4
+    python loadgen.py --url http://127.0.0.1:8000 --clients 1 2 4 8 --video clip.mp4
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+from aiortc import RTCConfiguration, RTCIceServer, RTCPeerConnection, RTCSessionDescription, VideoStreamTrack
+from av import VideoFrame
+
+from bench import RESOLUTIONS, summarize, synthetic_frames, video_frames
+
+MARKER_BITS = 16
+STANDIN_PORT = 3478  # the TURN port api.py assumes
+
+
+def marker_cells(h):
+    """Cell size and top-left corner of the marker strip.
+
+    Bottom left of the outgoing frame, below the board; the server mirrors
+    the frame, so it comes back bottom right.
+    """
+    cell = max(8, h // 45)
+    return cell, cell, h - 2 * cell
+
+
+def stamp_marker(img, seq):
+    """Draw `seq` as a white start cell, MARKER_BITS data cells and a black stop cell."""
+    cell, x0, y0 = marker_cells(img.shape[0])
+    bits = [1] + [(seq >> i) & 1 for i in range(MARKER_BITS)] + [0]
+    for i, bit in enumerate(bits):
+        x = x0 + i * cell
+        img[y0:y0 + cell, x:x + cell] = 255 if bit else 0
+
+
+def read_marker(img):
+    """Sequence number stamped on a (mirrored) processed frame, or None."""
+    h, w = img.shape[:2]
+    cell, x0, y0 = marker_cells(h)
+    # Undo the server's mirroring by reading the strip right to left
+    x_end = w - x0
+    m = cell // 4  # sample cell centres, away from compression ringing at the edges
+    levels = []
+    for i in range(MARKER_BITS + 2):
+        x = x_end - (i + 1) * cell
+        levels.append(img[y0 + m:y0 + cell - m, x + m:x + cell - m].mean())
+    bits = [level > 128 for level in levels]
+    if not bits[0] or bits[-1]:
+        return None
+    return sum(1 << i for i, bit in enumerate(bits[1:-1]) if bit)
+
+
+class MarkedTrack(VideoStreamTrack):
+    """Loops over `frames`, stamping each with its sequence number."""
+
+    def __init__(self, frames, sent):
+        super().__init__()
+        self.frames = frames
+        self.sent = sent
+        self.seq = 0
+
+    async def recv(self):
+        pts, time_base = await self.next_timestamp()
+        img = self.frames[self.seq % len(self.frames)].copy()
+        seq = self.seq % (1 << MARKER_BITS)
+        stamp_marker(img, seq)
+        self.sent[seq] = time.perf_counter()
+        self.seq += 1
+        frame = VideoFrame.from_ndarray(img, format="bgr24")
+        frame.pts = pts
+        frame.time_base = time_base
+        return frame
+
+
+def split_candidates(sdp):
+    """Offer SDP without its a=candidate lines, and those candidates as
+    /candidate bodies, as a trickling browser would send them."""
+    lines, candidates = [], []
+    mline = -1
+    mid = None
+    for line in sdp.splitlines():
+        if line.startswith("m="):
+            mline += 1
+            mid = None
+        elif line.startswith("a=mid:"):
+            mid = line[len("a=mid:"):]
+        if line.startswith("a=candidate:"):
+            candidates.append({"candidate": line[2:], "sdpMid": mid, "sdpMLineIndex": mline})
+        elif line != "a=end-of-candidates":
+            lines.append(line)
+    return "\r\n".join(lines) + "\r\n", candidates
+
+
+class Client:
+    def __init__(self, index, frames, res, ice_servers=(), trickle=False):
+        self.index = index
+        self.frames = frames
+        self.res = res
+        self.trickle = trickle
+        self.pc = RTCPeerConnection(RTCConfiguration(iceServers=list(ice_servers)))
+        self.offer_time = None
+        self.first_frame = None  # seconds from /offer to the first processed frame
+        self.session_id = None
+        self.sent = {}
+        self.received = []  # receive times in the measured window
+        self.latencies = []
+        self.unreadable = 0
+        self.measuring = False
+        self.error = None
+        self.reader = None
+
+    async def connect(self, http, url):
+        self.pc.addTrack(MarkedTrack(self.frames, self.sent))
+
+        @self.pc.on("track")
+        def on_track(track):
+            self.reader = asyncio.ensure_future(self.read(track))
+
+        await self.pc.setLocalDescription(await self.pc.createOffer())
+        sdp, candidates = self.pc.localDescription.sdp, []
+        if self.trickle:
+            sdp, candidates = split_candidates(sdp)
+        self.offer_time = time.perf_counter()
+        r = await http.post(f"{url}/offer", json={
+            "sdp": sdp,
+            "type": self.pc.localDescription.type,
+            "resolution": self.res,
+        })
+        if r.status_code != 200:
+            raise RuntimeError(f"client {self.index}: /offer answered {r.status_code} {r.text}")
+        answer = r.json()
+        self.session_id = answer.get("session_id")
+        await self.pc.setRemoteDescription(RTCSessionDescription(sdp=answer["sdp"], type=answer["type"]))
+        if self.trickle:
+            for body in candidates + [{"candidate": ""}]:
+                await http.post(f"{url}/candidate", json={"session_id": self.session_id, **body})
+
+    async def read(self, track):
+        try:
+            while True:
+                frame = await track.recv()
+                now = time.perf_counter()
+                if self.first_frame is None:
+                    self.first_frame = now - self.offer_time
+                if not self.measuring:
+                    continue
+                self.received.append(now)
+                seq = read_marker(frame.to_ndarray(format="bgr24"))
+                sent = self.sent.pop(seq, None) if seq is not None else None
+                if sent is None:
+                    self.unreadable += 1
+                else:
+                    self.latencies.append(now - sent)
+        except Exception as e:
+            self.error = e
+
+    async def close(self, http, url):
+        if self.session_id is not None:
+            try:
+                await http.post(f"{url}/stop", json={"session_id": self.session_id})
+            except httpx.HTTPError:
+                pass
+        if self.reader is not None:
+            self.reader.cancel()
+        await self.pc.close()
+
+    def results(self, seconds):
+        return {
+            "fps": len(self.received) / seconds,
+            "frames": len(self.received),
+            "unreadable_markers": self.unreadable,
+            "first_frame_s": self.first_frame,
+            "latency": summarize(self.latencies) if self.latencies else None,
+        }
+
+
+def parse_metric(text, name):
+    match = re.search(rf"^{name}(?:{{}})? ([0-9.eE+-]+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+async def server_cpu_seconds(http, url):
+    """API process plus frame worker CPU seconds, from /metrics."""
+    text = (await http.get(f"{url}/metrics")).text
+    return parse_metric(text, "process_cpu_seconds_total") + parse_metric(text, "connect4_worker_cpu_seconds_total")
+
+
+async def run(url, n, frames, res, warmup, duration, ice_servers=(), trickle=False):
+    clients = [Client(i, frames, res, ice_servers, trickle) for i in range(n)]
+    async with httpx.AsyncClient(timeout=60) as http:
+        try:
+            await asyncio.gather(*(c.connect(http, url) for c in clients))
+            await asyncio.sleep(warmup)
+
+            cpu_start = await server_cpu_seconds(http, url)
+            for c in clients:
+                c.measuring = True
+            start = time.perf_counter()
+            await asyncio.sleep(duration)
+            for c in clients:
+                c.measuring = False
+            seconds = time.perf_counter() - start
+            cpu = await server_cpu_seconds(http, url) - cpu_start
+        finally:
+            await asyncio.gather(*(c.close(http, url) for c in clients), return_exceptions=True)
+
+    per_client = [c.results(seconds) for c in clients]
+    latencies = [lat for c in clients for lat in c.latencies]
+    first_frames = [c.first_frame for c in clients if c.first_frame is not None]
+    return {
+        "clients": n,
+        "seconds": seconds,
+        "fps_mean": float(np.mean([r["fps"] for r in per_client])),
+        "fps_min": float(np.min([r["fps"] for r in per_client])),
+        "latency": summarize(latencies) if latencies else None,
+        "first_frame": summarize(first_frames) if first_frames else None,
+        "server_cpu_cores": cpu / seconds,
+        "server_cpu_cores_per_session": cpu / seconds / n,
+        "errors": [repr(c.error) for c in clients if c.error is not None],
+        "per_client": per_client,
+    }
+
+
+def start_standin():
+    """Run stunserver.py on STANDIN_PORT."""
+    return subprocess.Popen(
+        [sys.executable, "stunserver.py", "--port", str(STANDIN_PORT)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL,
+    )
+
+
+def start_server(port, standin=False):
+    """Run the backend on loopback with STUN/TURN disabled, or pointed at the stand-in."""
+    if standin:
+        env = dict(os.environ, USE_ICE_SERVERS="1", STUN_SERVER=f"stun:127.0.0.1:{STANDIN_PORT}",
+                   TURN_SERVER_IP="127.0.0.1")
+    else:
+        env = dict(os.environ, USE_ICE_SERVERS="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("Server exited during startup")
+        try:
+            # Wait for warm-up too, so it doesn't count towards session start times
+            if httpx.get(url + "/ready", timeout=1).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise SystemExit("Server did not start within 120s")
+
+
+def print_result(r):
+    lat = r["latency"]
+    lat_str = f"latency p50 {lat['p50_ms']:.0f}ms p95 {lat['p95_ms']:.0f}ms" if lat else "no latency samples"
+    first = r["first_frame"]
+    first_str = f"first frame p50 {first['p50_ms']:.0f}ms max {first['max_ms']:.0f}ms" if first else "no frames"
+    print(f"{r['clients']:>3} clients  fps mean {r['fps_mean']:.1f} min {r['fps_min']:.1f}  {lat_str}  {first_str}  "
+          f"server CPU {r['server_cpu_cores']:.2f} cores ({r['server_cpu_cores_per_session']:.2f}/session)")
+    for e in r["errors"]:
+        print(f"    error: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test over loopback WebRTC.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Backend to test")
+    parser.add_argument("--serve", action="store_true", help="Start a backend on --port for the test")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1], help="Client counts to test in turn")
+    parser.add_argument("--video", help="Video file to stream (default: synthetic frames)")
+    parser.add_argument("--res", type=int, choices=sorted(RESOLUTIONS), default=720)
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds before measuring")
+    parser.add_argument("--duration", type=float, default=20, help="Measured seconds per client count")
+    parser.add_argument("--standin", action="store_true",
+                        help=f"Run the local STUN/TURN stand-in on port {STANDIN_PORT} and use it on both sides")
+    parser.add_argument("--trickle", action="store_true", help="Send ICE candidates to /candidate after the offer")
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    w, h = RESOLUTIONS[args.res]
+    frames = video_frames(args.video, w, h, 300) if args.video else synthetic_frames(w, h, 60)
+
+    standin = start_standin() if args.standin else None
+    ice_servers = [RTCIceServer(urls=f"stun:127.0.0.1:{STANDIN_PORT}")] if args.standin else []
+    server, url = start_server(args.port, args.standin) if args.serve else (None, args.url)
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": args.video or "synthetic",
+        "res": args.res,
+        "standin": args.standin,
+        "trickle": args.trickle,
+        "runs": [],
+    }
+    try:
+        for n in args.clients:
+            r = asyncio.run(run(url, n, frames, args.res, args.warmup, args.duration, ice_servers, args.trickle))
+            print_result(r)
+            results["runs"].append(r)
+    finally:
+        for proc in (server, standin):
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import bisect
+import threading
+import time
+
+# Frame stage latencies sit between well under a millisecond (drawing) and
+# tens of milliseconds (inference); the top buckets catch stalls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.0075, 0.01, 0.015, 0.02, 0.03,
+    0.05, 0.075, 0.1, 0.2, 0.5, 1.0,
+)
+
+
+def format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{k}="{v}"' for k, v in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram, safe to observe from worker threads."""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = [(labels, list(series)) for labels, series in self.series.items()]
+        for labels, series in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = format_labels(self.labelnames + ("le",), labels + (bound,))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_str = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {series[-1]}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class CallbackGauge:
+    """Gauge whose samples are read from `collect()` at scrape time.
+
+    `collect` returns (label values, value) pairs, so series for sessions that
+    have gone away simply stop being reported.
+    """
+
+    def __init__(self, name, help, collect, labelnames=(), kind="gauge"):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    "connect4_frame_stage_seconds", "Time spent in each stage of the frame pipeline.", ["stage"]
+))
+frame_seconds = registry.register(Histogram(
+    "connect4_frame_seconds", "End-to-end processing time per frame, decode to encode."
+))
+frames_processed = registry.register(Counter(
+    "connect4_frames_processed_total", "Frames processed across all sessions."
+))
+frames_dropped = registry.register(Counter(
+    "connect4_frames_dropped_total", "Stale frames dropped across all sessions."
+))
+# From /offer arriving to the answer going out, ICE connecting and the first
+# processed frame going back; seconds rather than milliseconds
+session_start_seconds = registry.register(Histogram(
+    "connect4_session_start_seconds", "Time from /offer to each session start milestone.", ["milestone"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+))
+registry.register(CallbackGauge(
+    "process_cpu_seconds_total", "CPU time used by this process.",
+    lambda: [((), time.process_time())], kind="counter"
+))
@@ -0,0 +1,83 @@
+# Quality ladder, cheapest last. Each rung only ever lowers the session's
+# configured settings: detect_scale is capped, infer_every and drop_every
+# are raised to at least the rung's value.
+LEVELS = [
+    {"draw_landmarks": True, "detect_scale": 1.0, "infer_every": 1, "drop_every": 1},
+    {"draw_landmarks": False, "detect_scale": 1.0, "infer_every": 1, "drop_every": 1},
+    {"draw_landmarks": False, "detect_scale": 0.5, "infer_every": 1, "drop_every": 1},
+    {"draw_landmarks": False, "detect_scale": 0.5, "infer_every": 2, "drop_every": 1},
+    {"draw_landmarks": False, "detect_scale": 0.5, "infer_every": 3, "drop_every": 1},
+    {"draw_landmarks": False, "detect_scale": 0.5, "infer_every": 3, "drop_every": 2},
+]
+
+
+class QualityController:
+    """Steps a session's quality down when frames take longer than the frame
+    interval allows, and back up once there is clear headroom.
+
+    Processing time and frame interval are both smoothed. Stepping down needs
+    `down_after` consecutive slow frames; stepping up needs `up_after` fast
+    ones, so the level does not flap around the threshold.
+    """
+
+    def __init__(self, base_scale=1.0, base_infer_every=1, headroom=0.8,
+                 down_after=5, up_after=60, default_interval=1 / 20):
+        self.base_scale = base_scale
+        self.base_infer_every = base_infer_every
+        self.headroom = headroom
+        self.down_after = down_after
+        self.up_after = up_after
+        self.level = 0
+        self.avg_seconds = None
+        self.interval = default_interval
+        self.slow = 0
+        self.fast = 0
+
+    def settings(self):
+        rung = LEVELS[self.level]
+        return {
+            "draw_landmarks": rung["draw_landmarks"],
+            "detect_scale": min(self.base_scale, rung["detect_scale"]),
+            "infer_every": max(self.base_infer_every, rung["infer_every"]),
+            "drop_every": rung["drop_every"],
+        }
+
+    def apply(self, game):
+        s = self.settings()
+        game.draw_landmarks = s["draw_landmarks"]
+        game.detect_scale = s["detect_scale"]
+        game.infer_every = s["infer_every"]
+
+    def observe_interval(self, seconds):
+        """Time between incoming frames, from their timestamps."""
+        if 0 < seconds < 1:
+            self.interval = 0.9 * self.interval + 0.1 * seconds
+
+    def update(self, seconds):
+        """Feed one frame's processing time. Returns True if the level changed."""
+        if self.avg_seconds is None:
+            self.avg_seconds = seconds
+        else:
+            self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * seconds
+
+        # A frame may use this much of the interval it is shown for
+        budget = self.interval * LEVELS[self.level]["drop_every"] * self.headroom
+        if self.avg_seconds > budget:
+            self.slow += 1
+            self.fast = 0
+        elif self.avg_seconds < budget * 0.5:
+            self.fast += 1
+            self.slow = 0
+        else:
+            self.slow = self.fast = 0
+
+        if self.slow >= self.down_after and self.level < len(LEVELS) - 1:
+            self.level += 1
+        elif self.fast >= self.up_after and self.level > 0:
+            self.level -= 1
+        else:
+            return False
+        self.slow = self.fast = 0
+        # Old timings were measured at the previous level
+        self.avg_seconds = None
+        return True
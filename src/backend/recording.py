@@ -0,0 +1,242 @@
+"""Compact hand-landmark recordings and MediaPipe-free replay.
+
+A recording is a 16-byte header followed by fixed-stride records, one per
+processed frame: timestamp, a hand-present flag and the 21 normalised
+landmarks as float32. The header holds the size of the session's first
+frame, which replays lay the board out for. Files are read back with
+np.memmap, so replaying a recording costs no parsing and no copies.
+
+Game resets and restores are recorded in the same stream as event records,
+so multi-game sessions replay as they were played. A restore carries the
+game snapshot in the landmark bytes of one or more consecutive records.
+
+    python recording.py replay session1.c4lm session2.c4lm
+"""
+import argparse
+import struct
+import sys
+import time
+
+import numpy as np
+
+MAGIC = b"C4LM"
+VERSION = 2
+HEADER = struct.Struct("<4sHHII")  # magic, version, landmark count, frame w, frame h
+HEADER_SIZE = 16
+NUM_LANDMARKS = 21
+
+RECORD_DTYPE = np.dtype([
+    ("t", "<f8"),
+    ("present", "u1"),
+    ("kind", "u1"),
+    ("size", "<u2"),  # payload bytes, for restore records
+    ("landmarks", "<f4", (NUM_LANDMARKS, 3)),
+])
+# Record kinds. Version 1 files have zero padding there, so read as all frames
+FRAME, RESET, RESTORE = 0, 1, 2
+PAYLOAD_OFFSET = RECORD_DTYPE.fields["landmarks"][1]
+PAYLOAD_SIZE = RECORD_DTYPE["landmarks"].itemsize
+
+
+class LandmarkRecorder:
+    """Appends one record per processed frame to a recording file.
+
+    Without a frame size up front, the header's size is filled in from the
+    first frame's `frame_size`.
+    """
+
+    def __init__(self, path, frame_w=0, frame_h=0):
+        self.path = path
+        self.file = open(path, "wb")
+        self.frame_size = (frame_w, frame_h)
+        self.write_header()
+        self.record_buf = np.zeros(1, dtype=RECORD_DTYPE)
+        self.count = 0
+
+    def write_header(self):
+        end = self.file.tell()
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, NUM_LANDMARKS, *self.frame_size))
+        if end:
+            self.file.seek(end)
+
+    def record(self, t, landmarks, frame_size=(0, 0)):
+        """landmarks: (21, 3) normalised coordinates, or None when no hand was seen.
+        frame_size: (w, h) of the frame they were found in."""
+        if not all(self.frame_size) and all(frame_size):
+            self.frame_size = tuple(frame_size)
+            self.write_header()
+        rec = self.record_buf[0]
+        rec["t"] = t
+        rec["kind"] = FRAME
+        rec["size"] = 0
+        if landmarks is None:
+            rec["present"] = 0
+            rec["landmarks"] = 0
+        else:
+            rec["present"] = 1
+            rec["landmarks"] = landmarks
+        self.file.write(self.record_buf.tobytes())
+        self.count += 1
+
+    def record_reset(self, t):
+        """The game was reset at time `t`."""
+        self.write_event(t, RESET, b"")
+
+    def record_restore(self, t, snapshot):
+        """The game was restored from `snapshot` (Game.snapshot() bytes) at time `t`."""
+        for start in range(0, len(snapshot), PAYLOAD_SIZE):
+            self.write_event(t, RESTORE, snapshot[start:start + PAYLOAD_SIZE])
+
+    def write_event(self, t, kind, payload):
+        event = np.zeros(1, dtype=RECORD_DTYPE)
+        event["t"] = t
+        event["kind"] = kind
+        event["size"] = len(payload)
+        raw = bytearray(event.tobytes())
+        raw[PAYLOAD_OFFSET:PAYLOAD_OFFSET + len(payload)] = payload
+        self.file.write(raw)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def load(path):
+    """Memory-map a recording. Returns (records, frame_w, frame_h)."""
+    with open(path, "rb") as f:
+        magic, version, n_landmarks, frame_w, frame_h = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version not in (1, VERSION) or n_landmarks != NUM_LANDMARKS:
+        raise ValueError(f"{path} is not a version 1 or {VERSION} landmark recording")
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE)
+    return records, frame_w, frame_h
+
+
+class Point:
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+
+
+class ReplayHand:
+    __slots__ = ("landmark",)
+
+    def __init__(self, landmarks):
+        self.landmark = [Point(float(x), float(y), float(z)) for x, y, z in landmarks]
+
+
+class ReplayResults:
+    __slots__ = ("multi_hand_landmarks",)
+
+    def __init__(self, hands):
+        self.multi_hand_landmarks = hands
+
+
+class LandmarkReplay:
+    """Stand-in for mediapipe Hands that plays a recording back.
+
+    Each process() call returns the next recorded frame, so a Game built with
+    `hands=LandmarkReplay(path)` runs its full pipeline without MediaPipe.
+    Recordings hold one record per frame, normalised to the whole frame, so
+    Game runs a replay on every frame and uncropped whatever its
+    infer_every and detect_roi say (see `replays_frames`). Reset and restore
+    events are skipped; replay() applies them.
+    """
+
+    replays_frames = True
+
+    def __init__(self, path):
+        self.records, _, _ = load(path)
+        self.index = 0
+
+    def process(self, image):
+        while self.index < len(self.records) and self.records[self.index]["kind"] != FRAME:
+            self.index += 1
+        if self.index >= len(self.records):
+            return ReplayResults(None)
+        rec = self.records[self.index]
+        self.index += 1
+        if not rec["present"]:
+            return ReplayResults(None)
+        return ReplayResults([ReplayHand(rec["landmarks"])])
+
+    def reset(self):
+        self.index = 0
+
+    def close(self):
+        pass
+
+
+def pinch_events(records, w, h):
+    """Vectorised pinch detection over a whole recording.
+
+    Mirrors the per-frame test in Game.process_frame: index (8) and thumb (4)
+    tips in clamped pixel coordinates, pinching below 5% of the frame width.
+    Returns (pinching mask, (n, 2) pinch midpoints).
+    """
+    tips = records["landmarks"][:, [8, 4], :2] * np.array([w, h], dtype=np.float32)
+    tips = np.clip(np.round(tips), 0, [w - 1, h - 1])
+    dist = np.hypot(*(tips[:, 0] - tips[:, 1]).T)
+    pinching = (records["present"] == 1) & (dist < w * 0.05)
+    return pinching, tips.mean(axis=1)
+
+
+def replay(path, game):
+    """Drive game's gesture and game logic from a recording, with no image work.
+
+    The board is laid out for the recorded frame size, as it was live, and
+    recorded resets and restores are applied where they happened.
+    """
+    records, frame_w, frame_h = load(path)
+    if frame_w and frame_h:
+        game.set_layout(frame_w, frame_h)
+    pinching, positions = pinch_events(records, game.screen_w, game.screen_h)
+    times = records["t"]
+    kinds = records["kind"]
+    raw = records.view(np.uint8).reshape(len(records), RECORD_DTYPE.itemsize)
+    snapshot = bytearray()
+    for i in range(len(records)):
+        kind = kinds[i]
+        if kind == RESTORE:
+            # A snapshot spans consecutive restore records
+            snapshot += raw[i, PAYLOAD_OFFSET:PAYLOAD_OFFSET + records["size"][i]].tobytes()
+            if i + 1 == len(records) or kinds[i + 1] != RESTORE:
+                game.restore(bytes(snapshot))
+                snapshot.clear()
+        elif kind == RESET:
+            game.reset()
+        else:
+            pos = positions[i] if pinching[i] else None
+            game.update_game(bool(pinching[i]), pos, float(times[i]))
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Landmark recording tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rp = sub.add_parser("replay", help="Replay recordings through the game logic")
+    rp.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    from game import Game
+
+    # One game object reused across recordings; only the logic is exercised
+    game = Game(hands=LandmarkReplay(args.paths[0]))
+    frames = 0
+    start = time.perf_counter()
+    for path in args.paths:
+        game.reset()
+        replay(path, game)
+        frames += len(load(path)[0])
+        c4 = game.connect4
+        print(f"{path}: moves={''.join(map(str, c4.moves))} winner={c4.winner}")
+    elapsed = time.perf_counter() - start
+    print(f"{len(args.paths)} recordings, {frames} frames in {elapsed:.2f}s "
+          f"({frames / elapsed:.0f} frames/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import asyncio
+import time
+import uuid
+
+import metrics
+
+
+class Session:
+    """One player's connection: peer connection, processed track and hand tracker.
+
+    With a snapshot store and resume token, closing the session (other than
+    by /stop) leaves a snapshot of its game behind for a later /offer to
+    resume. `resume_from` holds a snapshot waiting for the track's game.
+
+    `started` is when its /offer arrived; `milestones` holds the seconds from
+    there to the answer, ICE connecting and the first processed frame.
+    """
+
+    def __init__(self, pc, hands, hand_pool, resume_token=None, snapshots=None, started=None,
+                 session_id=None):
+        self.id = session_id or uuid.uuid4().hex
+        self.pc = pc
+        self.hands = hands
+        self.hand_pool = hand_pool
+        self.resume_token = resume_token
+        self.snapshots = snapshots
+        self.resume_from = None
+        self.track = None
+        self.created = time.monotonic() if started is None else started
+        self.last_active = time.monotonic()
+        self.closed = False
+        self.milestones = {}
+
+    def attach_track(self, track):
+        """Hand the tracker over to the processed track; it returns it on close."""
+        self.track = track
+        self.hands = None
+
+    def mark(self, milestone):
+        """Record the first time a start milestone is reached."""
+        if milestone in self.milestones:
+            return
+        seconds = self.milestones[milestone] = time.monotonic() - self.created
+        metrics.session_start_seconds.observe(seconds, milestone)
+        if milestone == "first_frame":
+            steps = ", ".join(f"{name} {t:.2f}s" for name, t in self.milestones.items())
+            print(f"Session {self.id} started: {steps}")
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def idle_for(self, now):
+        last = self.last_active
+        if self.track is not None:
+            last = max(last, self.track.last_frame_time)
+        return now - last
+
+    async def close(self, keep_state=True):
+        if self.closed:
+            return
+        self.closed = True
+        keep_state = keep_state and self.snapshots is not None and self.resume_token is not None
+        if keep_state and self.resume_from is not None:
+            # Never got as far as restoring it; keep it for the next attempt
+            self.snapshots.put(self.resume_token, self.resume_from)
+        if self.track is not None:
+            if keep_state:
+                try:
+                    self.snapshots.put(self.resume_token, await self.track.snapshot())
+                except Exception as e:
+                    print(f"Could not snapshot session {self.id}: {e}")
+            await self.track.close()
+            self.track = None
+        if self.hands is not None:
+            self.hand_pool.release(self.hands)
+            self.hands = None
+        await self.pc.close()
+
+
+class SessionRegistry:
+    """Live sessions keyed by the ID returned from /offer.
+
+    Sessions are dropped when they close, go `idle_timeout` seconds without a
+    processed frame or control call, or outlive `ttl` seconds.
+    """
+
+    def __init__(self, ttl=3600, idle_timeout=60):
+        self.ttl = ttl
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    def add(self, session):
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session.touch()
+        return session
+
+    async def remove(self, session_id, keep_state=True):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            await session.close(keep_state)
+        return session
+
+    async def close_all(self):
+        for session_id in list(self.sessions):
+            await self.remove(session_id)
+
+    async def evict_expired(self):
+        now = time.monotonic()
+        expired = [
+            s.id for s in self.sessions.values()
+            if now - s.created > self.ttl or s.idle_for(now) > self.idle_timeout
+        ]
+        for session_id in expired:
+            print(f"Evicting session {session_id}")
+            await self.remove(session_id)
+            self.evicted += 1
+        return len(expired)
+
+    async def run_evictor(self, interval=10):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_expired()
+            except Exception as e:
+                print(f"Session eviction failed: {e}")
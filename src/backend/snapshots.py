@@ -0,0 +1,71 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+def new_token():
+    """Unguessable resume token handed to the client in the /offer answer."""
+    return secrets.token_urlsafe(16)
+
+
+class SnapshotStore:
+    """Bounded in-memory store of game snapshots keyed by resume token.
+
+    Holds at most `max_entries` snapshots for at most `ttl` seconds each;
+    when full, the oldest snapshot is dropped. A snapshot is handed out once:
+    `take` removes it.
+    """
+
+    def __init__(self, max_entries=256, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # token -> (stored at, snapshot bytes)
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.stored = 0
+        self.resumed = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def put(self, token, data):
+        with self.lock:
+            self.entries.pop(token, None)
+            self.entries[token] = (time.monotonic(), data)
+            self.stored += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.expired += 1
+
+    def take(self, token):
+        """The snapshot stored under `token`, or None if unknown or expired."""
+        with self.lock:
+            self.expire()
+            entry = self.entries.pop(token, None)
+            if entry is None:
+                return None
+            self.resumed += 1
+            return entry[1]
+
+    def expire(self):
+        cutoff = time.monotonic() - self.ttl
+        while self.entries:
+            token, (stored_at, _) = next(iter(self.entries.items()))
+            if stored_at >= cutoff:
+                break
+            del self.entries[token]
+            self.expired += 1
+
+    def stats(self):
+        with self.lock:
+            self.expire()
+            return {
+                "snapshots": len(self.entries),
+                "bytes": sum(len(data) for _, data in self.entries.values()),
+                "stored": self.stored,
+                "resumed": self.resumed,
+                "expired": self.expired,
+            }
@@ -0,0 +1,78 @@
+"""Local stand-in for the STUN/TURN servers, for testing session start-up
+without reaching Google's STUN servers or a real TURN server.
+
+Answers STUN Binding requests with the sender's address, optionally after a
+delay to mimic a remote server. TURN Allocate requests get an immediate 508
+(Insufficient Capacity), so clients give up on relaying straight away rather
+than waiting out a timeout. Point both at it with:
+
+    python stunserver.py --port 3478 --delay-ms 40
+    STUN_SERVER=stun:127.0.0.1:3478 TURN_SERVER_IP=127.0.0.1 uvicorn api:app
+"""
+import argparse
+import asyncio
+
+from aioice import stun
+
+
+class StandInProtocol(asyncio.DatagramProtocol):
+    def __init__(self, delay):
+        self.delay = delay
+        self.transport = None
+        self.counts = {"binding": 0, "allocate": 0, "other": 0}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            request = stun.parse_message(data)
+        except ValueError:
+            return
+        if request.message_class != stun.Class.REQUEST:
+            return
+
+        if request.message_method == stun.Method.BINDING:
+            self.counts["binding"] += 1
+            response = stun.Message(stun.Method.BINDING, stun.Class.RESPONSE, request.transaction_id)
+            response.attributes["XOR-MAPPED-ADDRESS"] = addr
+        else:
+            key = "allocate" if request.message_method == stun.Method.ALLOCATE else "other"
+            self.counts[key] += 1
+            response = stun.Message(request.message_method, stun.Class.ERROR, request.transaction_id)
+            response.attributes["ERROR-CODE"] = (508, "Insufficient Capacity")
+        response.attributes["SOFTWARE"] = "connect4ar-stun-stand-in"
+
+        if self.delay:
+            asyncio.get_running_loop().call_later(self.delay, self.transport.sendto, bytes(response), addr)
+        else:
+            self.transport.sendto(bytes(response), addr)
+
+
+async def serve(host, port, delay):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: StandInProtocol(delay), local_addr=(host, port)
+    )
+    print(f"STUN/TURN stand-in on udp://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        transport.close()
+        print(f"Requests answered: {protocol.counts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local STUN/TURN stand-in for testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3478)
+    parser.add_argument("--delay-ms", type=float, default=0, help="Delay before each answer, like a remote server")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.delay_ms / 1000))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
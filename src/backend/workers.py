@@ -0,0 +1,301 @@
+"""Frame processing sharded across worker processes.
+
+The API process keeps all WebRTC work and pins each session to one worker
+process, which owns that session's Game and MediaPipe tracker. Frames travel
+through a per-session shared-memory ring of frame slots; the pipe to the
+worker only carries the slot index, frame size and pending commands, so pixel
+data is never pickled.
+"""
+import multiprocessing as mp
+import threading
+import time
+import uuid
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from canvas import I420
+from handpool import PoolExhausted
+
+
+class FrameRing:
+    """`slots` frame slots (bgr24 or yuv420p) in one shared-memory block."""
+
+    def __init__(self, slots, slot_bytes, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = SharedMemory(create=True, size=slots * slot_bytes)
+        else:
+            # Workers share the API process's resource tracker, so attaching
+            # re-registers the same name and the creator's unlink clears it
+            self.shm = SharedMemory(name=name)
+        self.name = self.shm.name
+        self.index = 0
+
+    def view(self, slot, h, w, planar=False):
+        offset = slot * self.slot_bytes
+        if planar:
+            return I420.from_buffer(np.ndarray((h * w * 3 // 2,), np.uint8, self.shm.buf, offset=offset), h, w)
+        return np.ndarray((h, w, 3), np.uint8, self.shm.buf, offset=offset)
+
+    def next_slot(self):
+        self.index = (self.index + 1) % self.slots
+        return self.index
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def worker_main(conn, trackers):
+    """Worker process loop: one Game per session pinned here."""
+    import ai
+    from game import Game, create_hands, warm_up
+    from handpool import HandTrackerPool
+    from recording import LandmarkRecorder
+
+    hand_pool = HandTrackerPool(create_hands, trackers)
+    hand_pool.warm_up()
+    hands = hand_pool.acquire()
+    warm_up(hands)
+    hand_pool.release(hands)
+    # AI games on this worker search on its own pool
+    ai.warm_up()
+    games = {}
+    rings = {}
+    conn.send(("ready",))
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            # The API process is gone
+            break
+        op, session_id = msg[0], msg[1] if len(msg) > 1 else None
+        try:
+            if op == "open":
+                _, _, res, kwargs, record_path = msg
+                game = Game(res, hands=hand_pool.acquire(timeout=0), **kwargs)
+                if record_path:
+                    game.recorder = LandmarkRecorder(record_path)
+                games[session_id] = game
+                conn.send(("ok", None))
+            elif op == "frame":
+                _, _, ring_name, slots, slot_bytes, slot, h, w, planar, timestamp, commands, attrs = msg
+                game = games[session_id]
+                ring = rings.get(session_id)
+                if ring is None or ring.name != ring_name:
+                    if ring is not None:
+                        ring.close()
+                    ring = rings[session_id] = FrameRing(slots, slot_bytes, name=ring_name)
+                for command in commands:
+                    getattr(game, command)()
+                for attr, value in attrs.items():
+                    setattr(game, attr, value)
+                # Processed in place; the API process copies the slot out
+                img = ring.view(slot, h, w, planar)
+                game.process_frame(img, key=None, out=img, timestamp=timestamp)
+                conn.send(("ok", (game.stage_times, time.process_time())))
+            elif op == "snapshot":
+                conn.send(("ok", games[session_id].snapshot()))
+            elif op == "restore":
+                games[session_id].restore(msg[2])
+                conn.send(("ok", None))
+            elif op == "close":
+                game = games.pop(session_id, None)
+                if game is not None:
+                    hand_pool.release(game.hands)
+                    game.close()
+                ring = rings.pop(session_id, None)
+                if ring is not None:
+                    ring.close()
+                conn.send(("ok", None))
+            elif op == "stop":
+                break
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    for game in games.values():
+        game.close()
+    for ring in rings.values():
+        ring.close()
+    hand_pool.close()
+    ai.shutdown()
+
+
+class Worker:
+    def __init__(self, ctx, trackers):
+        self.conn, child = ctx.Pipe()
+        # Not a daemon: AI games run their searches on a process pool of the
+        # worker's own, and daemonic processes can't have children.
+        # WorkerPool.close() stops workers explicitly instead
+        self.process = ctx.Process(target=worker_main, args=(child, trackers))
+        self.process.start()
+        child.close()
+        # One request in flight per worker; sessions sharing it queue here
+        self.lock = threading.Lock()
+        self.trackers = trackers
+        self.sessions = 0
+        # Worker CPU time as of its last processed frame
+        self.cpu_seconds = 0.0
+
+    def call(self, *msg):
+        with self.lock:
+            self.conn.send(msg)
+            status, result = self.conn.recv()
+        if status == "error":
+            raise RuntimeError(f"frame worker {self.process.pid}: {result}")
+        return result
+
+
+class RemoteGame:
+    """API-process stand-in for a Game living in a worker process.
+
+    Supports what the capture track needs: process_frame, reset,
+    toggle_hands, snapshot/restore, the quality attributes, stage_times and close. Commands and
+    attribute changes ride along with the next frame.
+    """
+
+    def __init__(self, pool, worker, session_id, game_kwargs, slots=2):
+        self.pool = pool
+        self.worker = worker
+        self.session_id = session_id
+        self.slots = slots
+        self.ring = None
+        self.hands = None
+        self.commands = []
+        self.draw_landmarks = True
+        self.detect_scale = game_kwargs.get("detect_scale", 1.0)
+        self.infer_every = game_kwargs.get("infer_every", 1)
+        self.stage_times = {}
+
+    def reset(self):
+        self.commands.append("reset")
+
+    def toggle_hands(self):
+        self.commands.append("toggle_hands")
+
+    def process_frame(self, frame, key, out=None, timestamp=None):
+        planar = isinstance(frame, I420)
+        h, w = frame.shape[:2]
+        if self.ring is None or self.ring.slot_bytes < frame.nbytes:
+            if self.ring is not None:
+                self.ring.close()
+            self.ring = FrameRing(self.slots, frame.nbytes)
+        slot = self.ring.next_slot()
+        img = self.ring.view(slot, h, w, planar)
+        if planar:
+            frame.copy_to(img)
+        else:
+            np.copyto(img, frame)
+
+        commands, self.commands = self.commands, []
+        attrs = {
+            "draw_landmarks": self.draw_landmarks,
+            "detect_scale": self.detect_scale,
+            "infer_every": self.infer_every,
+        }
+        self.stage_times, self.worker.cpu_seconds = self.worker.call(
+            "frame", self.session_id, self.ring.name, self.ring.slots, self.ring.slot_bytes,
+            slot, h, w, planar, timestamp, commands, attrs
+        )
+        if out is None:
+            out = I420.from_buffer(np.empty(frame.nbytes, np.uint8), h, w) if planar else np.empty_like(img)
+        if planar:
+            img.copy_to(out)
+        else:
+            np.copyto(out, img)
+        return out
+
+    def snapshot(self):
+        return self.worker.call("snapshot", self.session_id)
+
+    def restore(self, data):
+        self.worker.call("restore", self.session_id, data)
+
+    def close(self):
+        try:
+            self.worker.call("close", self.session_id)
+        except (OSError, EOFError, RuntimeError) as e:
+            print(f"Closing remote game failed: {e}")
+        finally:
+            self.pool.unpin(self.worker)
+            if self.ring is not None:
+                self.ring.close()
+                self.ring = None
+
+
+class WorkerPool:
+    """N frame worker processes, each with its own pre-warmed hand trackers.
+
+    Sessions are pinned to the least loaded worker for their lifetime.
+    `trackers` is the total tracker count, split as evenly as possible across
+    workers (no more workers than trackers); it caps concurrent sessions the
+    same way HandTrackerPool does.
+    """
+
+    def __init__(self, processes, trackers):
+        self.trackers = max(1, trackers)
+        self.processes = max(1, min(processes, self.trackers))
+        base, extra = divmod(self.trackers, self.processes)
+        self.split = [base + (i < extra) for i in range(self.processes)]
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Spawn the workers and wait for each to warm up its trackers."""
+        ctx = mp.get_context("spawn")
+        self.workers = [Worker(ctx, trackers) for trackers in self.split]
+        for worker in self.workers:
+            worker.conn.recv()
+
+    def open(self, res, game_kwargs, record_path=None):
+        """Create a session's Game on a worker and return its RemoteGame."""
+        with self.lock:
+            # Least loaded relative to its tracker count, so uneven splits fill evenly
+            worker = min(self.workers, key=lambda w: w.sessions / w.trackers)
+            if worker.sessions >= worker.trackers:
+                raise PoolExhausted(f"all {self.trackers} hand trackers are in use")
+            worker.sessions += 1
+        session_id = uuid.uuid4().hex
+        try:
+            worker.call("open", session_id, res, game_kwargs, record_path)
+        except Exception:
+            self.unpin(worker)
+            raise
+        return RemoteGame(self, worker, session_id, game_kwargs)
+
+    def unpin(self, worker):
+        with self.lock:
+            worker.sessions -= 1
+
+    def release(self, game):
+        """Close a RemoteGame whose session never got a track."""
+        game.close()
+
+    def close(self):
+        for worker in self.workers:
+            try:
+                with worker.lock:
+                    worker.conn.send(("stop",))
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self.workers = []
+
+    def cpu_seconds(self):
+        return sum(w.cpu_seconds for w in self.workers)
+
+    def stats(self):
+        return {
+            "processes": len(self.workers),
+            "size": sum(w.trackers for w in self.workers),
+            "in_use": sum(w.sessions for w in self.workers),
+            **{f"worker_{i}_sessions": w.sessions for i, w in enumerate(self.workers)},
+        }
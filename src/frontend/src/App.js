@@ -7,6 +7,9 @@ function App() {
   const remoteVideoRef = useRef(null);
   const [pc, setPc] = useState(null);
   const [streaming, setStreaming] = useState(false);
+  const [sessionId, setSessionId] = useState(null);
+  // Lets a dropped connection pick its game back up on the next start
+  const resumeToken = useRef(sessionStorage.getItem("resumeToken"));
 
 
   const startGame = async () => {
@@ -47,6 +50,26 @@ function App() {
     // Add local tracks
     localStream.getTracks().forEach(track => pc.addTrack(track, localStream));
 
+    // Trickle ICE: candidates go to the backend as they are found; those found
+    // before the answer (and its session ID) arrives are sent right after it
+    let candidateSession = null;
+    const earlyCandidates = [];
+    const sendCandidate = (candidate) =>
+      fetch(`${BACKEND_URL}/candidate`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          session_id: candidateSession,
+          candidate: candidate ? candidate.candidate : "",  // empty: end of candidates
+          sdpMid: candidate?.sdpMid,
+          sdpMLineIndex: candidate?.sdpMLineIndex,
+        }),
+      }).catch((err) => console.warn("Sending ICE candidate failed:", err));
+    pc.onicecandidate = (event) => {
+      if (candidateSession) sendCandidate(event.candidate);
+      else earlyCandidates.push(event.candidate);
+    };
+
     // Create offer after tracks are added
     const offer = await pc.createOffer();
     await pc.setLocalDescription(offer);
@@ -55,12 +78,33 @@ function App() {
     const response = await fetch(`${BACKEND_URL}/offer`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ sdp: offer.sdp, type: offer.type, resolution: 720 }),
+      body: JSON.stringify({
+        sdp: offer.sdp,
+        type: offer.type,
+        resolution: 720,
+        resume_token: resumeToken.current,
+      }),
     });
-    const answer = await response.json();
+    const answer = await response.json().catch(() => ({}));
+    if (!response.ok) {
+      // e.g. 503 when every tracker is busy. The old resume token stays: the
+      // server kept that game, so the next start can still pick it up
+      console.warn(`Offer failed (${response.status}):`, answer.error || response.statusText);
+      pc.close();
+      setPc(null);
+      localStream.getTracks().forEach((t) => t.stop());
+      if (localVideoRef.current) localVideoRef.current.srcObject = null;
+      setStreaming(false);
+      return;
+    }
+    setSessionId(answer.session_id);
+    candidateSession = answer.session_id;
+    earlyCandidates.forEach(sendCandidate);
+    resumeToken.current = answer.resume_token;
+    sessionStorage.setItem("resumeToken", answer.resume_token);
 
     // Set remote description
-    await pc.setRemoteDescription(answer);
+    await pc.setRemoteDescription({ sdp: answer.sdp, type: answer.type });
   };
 
   // Stop game / close peer connection
@@ -71,8 +115,16 @@ function App() {
       setPc(null);
     }
 
+    setSessionId(null);
+    // Stopping ends the game for good
+    resumeToken.current = null;
+    sessionStorage.removeItem("resumeToken");
     try {
-      await fetch(`${BACKEND_URL}/stop`, { method: "POST" });
+      await fetch(`${BACKEND_URL}/stop`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ session_id: sessionId })
+      });
     } catch (err) {
       console.warn("Backend stop call failed:", err);
     }
@@ -93,7 +145,7 @@ function App() {
       await fetch(`${BACKEND_URL}/reset`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({})
+        body: JSON.stringify({ session_id: sessionId })
       });
     } catch (err) {
       console.warn("Backend reset call failed:", err);
@@ -105,7 +157,7 @@ function App() {
       await fetch(`${BACKEND_URL}/toggle_tracking`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({})
+        body: JSON.stringify({ session_id: sessionId })
       });
     } catch (err) {
       console.warn("Backend toggle_hands call failed:", err);